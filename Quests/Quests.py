@@ -1,15 +1,13 @@
 import os
-import numpy as np
+import hashlib
 import random
 import asyncio
-from datetime import datetime, timedelta
+import time
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 
-import re
-import cv2
-import pandas as pd
 import aiohttp
-import aiofiles
-import tempfile
 
 import aiopytesseract
 
@@ -17,6 +15,59 @@ import discord
 from discord.ext import tasks
 
 from redbot.core import commands, Config
+from redbot.core.data_manager import cog_data_path
+
+from .catalog import QuestCatalog
+from .ledger import SCORED_RETENTION, FactionLedger
+from .ocr_cache import OcrCache, OcrEntry
+from .ocr_profiles import preprocess, tesseract_options
+from .rules import OCR, TEXT, fruit_rank, rule_for
+from .scored_store import ScoredStore
+from .suika import detect_fruits
+
+# Screenshots are downloaded into memory and handed to tesseract as bytes
+OCR_MAX_BYTES = 10 * 1024 * 1024
+OCR_TIMEOUT = aiohttp.ClientTimeout(total=30, sock_connect=10)
+OCR_CACHE_ENTRIES = 5000
+# a failed screenshot download is retried within the run; the next run may cover another quest
+DOWNLOAD_RETRIES = 3
+DOWNLOAD_BACKOFF = 2  # seconds, doubled per retry
+# submissions scored at once; each one is mostly waiting on a download or tesseract
+DEFAULT_SCORE_WORKERS = 4
+MAX_SCORE_WORKERS = 16
+# each guild's quest closes and the next one is posted at its own local time
+DEFAULT_QUEST_TIME = "12:00"
+DEFAULT_TIMEZONE = "UTC"
+# guilds whose quest posting or scoring runs at once
+QUEST_FANOUT = 8
+
+def _cached_score(entry, game, pattern):
+    """(found, score) from an OCR cache entry: its stored parse for this pattern, or a match in its text."""
+    if entry is None:
+        return False, None
+    cached = entry.parsed.get(game)
+    if cached and cached[0] == pattern.pattern:
+        return True, cached[1]
+    match = pattern.search(entry.text)
+    if match:
+        return True, match.group(1)
+    return False, None
+
+def _parse_quest_time(value):
+    """(hour, minute) from "HH:MM", or None if it isn't a valid time."""
+    try:
+        hour, minute = (int(part) for part in value.split(":"))
+    except (AttributeError, ValueError):
+        return None
+    if 0 <= hour < 24 and 0 <= minute < 60:
+        return hour, minute
+    return None
+
+def _local_now(tz_name):
+    try:
+        return datetime.now(ZoneInfo(tz_name))
+    except (ZoneInfoNotFoundError, ValueError):
+        return datetime.now(ZoneInfo(DEFAULT_TIMEZONE))
 
 def is_owner_overridable():
     # Similar to @commands.is_owner()
@@ -39,495 +90,376 @@ class Quests(commands.Cog):
             current_quest=None,
             faction_roles={},
             faction_scores={},
+            score_workers=DEFAULT_SCORE_WORKERS,
+            scored_messages={},  # legacy: moved to the ScoredStore on the guild's next scoring run
+            quest_time=DEFAULT_QUEST_TIME,
+            timezone=DEFAULT_TIMEZONE,
+            quest_posted_at=None,  # POSIX time the current quest went out
+            last_quest_day=None,  # local date of the last quest day the clock ran
         )
-
-    @commands.Cog.listener()
-    async def on_ready(self):
-        """Run role setup when bot is ready."""
-        self.send_daily_message_task.start()
-        self.score_quests_task.start()
-
-    def cog_unload(self):
-        self.send_daily_message_task.cancel()  # Stop the task if the cog is unloaded
-
-    async def ocr(self, url):
-        suffix = os.path.splitext(url.split('?')[0])[1] or ".img"
-        with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as temp_file:
-            temp_path = temp_file.name
-
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url) as resp:
-                resp.raise_for_status()
-                async with aiofiles.open(temp_path, 'wb') as f:
-                    await f.write(await resp.read())
-
-        text = await aiopytesseract.image_to_string(temp_path)
-        os.remove(temp_path)
-        return text
-
-    @tasks.loop(hours=25)
-    # @tasks.loop(minutes=1)
-    async def send_daily_message_task(self):
-        await self.send_daily_message()
-
-    async def send_daily_message(self):
-        print("Executing quest task")
+        # DKP of the scoring runs in progress per guild, flushed to Config when each run ends;
+        # overlapping runs share one ledger, kept until the last of them has flushed
+        self._ledgers = {}
+        self._ledger_runs = Counter()
+        # flushing is a read-modify-write of the stored scores, so it takes the guild's lock
+        self._score_locks = defaultdict(asyncio.Lock)
+        # games per day and their descriptions, reloaded when the files change
+        self.catalog = QuestCatalog(os.path.dirname(__file__))
+        # one pooled HTTP session for the cog's lifetime, created on first use
+        self._session = None
+        # rescoring a day only OCRs screenshots that weren't read before
+        self.ocr_cache = OcrCache(cog_data_path(self) / "ocr-cache.sqlite3", OCR_CACHE_ENTRIES)
+        # processed submissions, so reruns skip them; outside Config, which the clock reads every minute
+        self.scored_store = ScoredStore(cog_data_path(self) / "scored.sqlite3")
+        # per-game counts and timings of each OCR tier since the cog loaded
+        self.ocr_stats = defaultdict(Counter)
+        # quest days started by the clock, per guild, and the bound on them and the commands' runs
+        self._quest_days = {}
+        self._quest_fanout = asyncio.Semaphore(QUEST_FANOUT)
+
+        self.quest_clock.start()
+
+    async def cog_unload(self):
+        self.quest_clock.cancel()  # Stop the task if the cog is unloaded
+        for task in self._quest_days.values():
+            task.cancel()
+        if self._session:
+            await self._session.close()
+        self.ocr_cache.close()
+        self.scored_store.close()
+
+    def http(self):
+        """The cog's shared HTTP session, so image downloads reuse pooled connections."""
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(timeout=OCR_TIMEOUT)
+        return self._session
+
+    async def download(self, url, max_bytes=OCR_MAX_BYTES):
+        """Download an image into memory. Returns None if it's bigger than `max_bytes`."""
+        async with self.http().get(url) as resp:
+            resp.raise_for_status()
+            if resp.content_length and resp.content_length > max_bytes:
+                return None
+            data = bytearray()
+            async for chunk in resp.content.iter_chunked(64 * 1024):
+                data += chunk
+                if len(data) > max_bytes:
+                    return None
+        return bytes(data)
+
+    async def download_attachment(self, attachment):
+        """The attachment's bytes, or None if it's too big.
+
+        Download errors are raised rather than read as an unreadable screenshot, so
+        score_message can retry the submission instead of rejecting it for good.
+        """
+        image = await self.download(attachment.url)
+        if image is None:
+            print(f"Skipping OCR for {attachment.url}: image is over {OCR_MAX_BYTES // (1024 * 1024)} MB.")
+        return image
+
+    async def ocr(self, image, game, pattern, profile=None):
+        """OCR a screenshot and return (text, score `pattern` captured or None).
+
+        Games with a preprocessing profile get a cheap pass over just the cropped,
+        binarized score region first; the full image is only OCR'd if that misses.
+        """
+        stats = self.ocr_stats[game]
+        if profile:
+            started = time.perf_counter()
+            cropped = await asyncio.to_thread(preprocess, image, profile)
+            if cropped is not None:
+                text = await aiopytesseract.image_to_string(cropped, **tesseract_options(profile))
+                stats["cropped_tries"] += 1
+                stats["cropped_seconds"] += time.perf_counter() - started
+                match = pattern.search(text)
+                if match:
+                    stats["cropped_hits"] += 1
+                    return text, match.group(1)
+
+        started = time.perf_counter()
+        text = await aiopytesseract.image_to_string(image)
+        stats["full_tries"] += 1
+        stats["full_seconds"] += time.perf_counter() - started
+        match = pattern.search(text)
+        if match:
+            stats["full_hits"] += 1
+            return text, match.group(1)
+        stats["misses"] += 1
+        return text, None
+
+    async def _read_score(self, attachment, game, pattern, profile=None):
+        """The score compiled `pattern` captures from a screenshot, or None if it can't be read.
+
+        Earlier reads are reused: first for this attachment, then for the same image bytes.
+        """
+        self.ocr_stats[game]["reads"] += 1
+        found, score = _cached_score(await self.ocr_cache.get(attachment.id), game, pattern)
+        if found:
+            self.ocr_stats[game]["cache_hits"] += 1
+            return score
+
+        image = await self.download_attachment(attachment)
+        if image is None:
+            return None
+        sha256 = hashlib.sha256(image).hexdigest()
+        entry = await self.ocr_cache.get_by_hash(sha256)
+        found, score = _cached_score(entry, game, pattern)
+        if found:
+            self.ocr_stats[game]["cache_hits"] += 1
+        else:
+            text, score = await self.ocr(image, game, pattern, profile)
+            entry = OcrEntry(text, {})
+        entry.parsed[game] = [pattern.pattern, score]
+        await self.ocr_cache.put(attachment.id, sha256, entry)
+        return score
+
+    @tasks.loop(minutes=1)
+    async def quest_clock(self):
+        """Every minute, start the quest day of each guild whose local quest time has come.
+
+        Each day runs as its own task, so a long scoring run in one guild doesn't hold
+        up the tick, or another guild's quest closing on time.
+        """
         try:
-            for guild in self.bot.guilds:  
-                channel_id = await self.config.guild(guild).quests_channel_id()
-                role_id = await self.config.guild(guild).quests_role_id() 
-                quest_count = await self.config.guild(guild).quest_count()
-    
-                channel = self.bot.get_channel(channel_id)
-                if channel:
-                    if role_id:
-                        duple = await self.write_quest()
-                        message = duple[1]
-                        await channel.send(f"<@&{role_id}>\n{message}")
-                        await self.config.guild(guild).quest_count.set(quest_count+1)
-                        await self.config.guild(guild).current_quest.set(duple[0])
-                    else:
-                        print("Please set the quests role id.")
-                else:
-                    print("Please set the quests channel id.")
+            for guild_id, settings in (await self.config.all_guilds()).items():
+                if guild_id in self._quest_days:
+                    continue  # the guild's last quest day is still running
+                guild = self.bot.get_guild(guild_id)
+                quest_time = _parse_quest_time(settings.get("quest_time", DEFAULT_QUEST_TIME))
+                if guild is None or quest_time is None:
+                    continue
+                now = _local_now(settings.get("timezone", DEFAULT_TIMEZONE))
+                today = now.date().isoformat()
+                if settings.get("last_quest_day") != today and (now.hour, now.minute) >= quest_time:
+                    task = asyncio.create_task(self.bounded(self.run_quest_day(guild, settings, now)))
+                    self._quest_days[guild_id] = task
+                    task.add_done_callback(lambda t, gid=guild_id: self._quest_day_done(gid, t))
         except asyncio.CancelledError:
             print("Winding down the quest task.")
             raise
         except Exception as e:
             print(f"An error occured somewhere that makes me want to cry: {e}.")
 
-    async def write_quest(self):
-        """Generate a quest announcement depending on the day and return it as a string to be sent by the bot"""
-        day = datetime.now().strftime("%A").lower()
-        
-        # Read the games for the day
-        games_by_day = pd.read_csv(os.path.join(os.path.dirname(__file__), "games-by-day.csv"))
-        game_choices = games_by_day[day].dropna()
-        game = game_choices.iloc[random.randint(0, len(game_choices) - 1)]  # Choose a random game
-        
-        # Read the descriptions
-        desc_locs = pd.read_csv(os.path.join(os.path.dirname(__file__), "games-to-descs.csv"))
-        
-        # Get the location corresponding to the chosen game
-        game_index = desc_locs[desc_locs['Game'] == game].index[0]
-        description_location = desc_locs.at[game_index, 'description location']
-        
-        # Build the full path to the description file
-        loc = os.path.join(os.path.dirname(__file__), description_location)
-        
-        # Read the quest description from the file
-        quest = ""
-        async with aiofiles.open(loc, mode='r') as file:
-            quest = await file.read()
-    
-        return [game, quest]
-        
-    @send_daily_message_task.before_loop
-    async def before_send_daily_message(self):
-        await self.bot.wait_until_ready() 
-
-    @tasks.loop(hours=25)
-    async def score_quests_task(self):
-        await self.score_quests()
-
-    async def score_quests(self):
-        """start the scoring process if there are quests to score"""
-        for guild in self.bot.guilds:
-            count = await self.config.guild(guild).quest_count()
-            channel_id = await self.config.guild(guild).quests_channel_id()
-            if count > 0:
-                await self.fetch_messages(channel_id, guild)
-
-    @score_quests_task.before_loop
-    async def before_score_quest(self):
+    @quest_clock.before_loop
+    async def before_quest_clock(self):
         await self.bot.wait_until_ready()
-        await asyncio.sleep(86400)
-
-    async def fetch_messages(self, channel_id, guild):
-        """get the messages that need scoring and send them to the scoring method"""
-        channel = self.bot.get_channel(channel_id)
-        last_quest = datetime.now() - timedelta(hours=23, minutes=59)
-        current_quest = await self.config.guild(guild).current_quest()
-    
-        async for message in channel.history(after=last_quest):
-            if await self.scored(guild, message, str(current_quest)):
-                await message.add_reaction("✅")
-            else:
-                await message.add_reaction("❌")
-
-    async def scored(self, guild, message: discord.Message, quest_name: str):
-        """direct the program to the right method to score the quest of the day"""
-        quest_name = quest_name.lower()
-        if quest_name == '2048':
-            return self.number_game_score(guild, message)
-        elif quest_name == 'worldle':
-            return self.worLdle_score(guild, message)
-        elif 'globle' in quest_name: # score globle and globle-capital the same way
-            return self.globle_score(guild, message)
-        elif quest_name == 'dinosaur game':
-            return self.dino_score(guild, message)
-        elif quest_name == 'edge surfer':
-            return self.edge_surf_score(guild, message)
-        elif quest_name == 'slither.io':
-            return self.slitherio_score(guild, message)
-        elif quest_name == 'wordle':
-            return self.wordle_score(guild, message)
-        elif quest_name == 'connections':
-            return self.connections_score(guild, message)
-        elif quest_name == 'semantle':
-            return self.semantle_score(guild, message)
-        elif quest_name == 'tetr.io':
-            return self.tetrio_score(guild, message)
-        elif quest_name == 'suika game':
-            return self.suika_score(guild, message)
-        elif quest_name == 'bandle':
-            return self.bandle_score(guild, message)
-        else:
-            return False
-
-    async def number_game_score(self, guild: discord.Guild, message: discord.Message):
-        dkp = 0
-        attachments = message.attachments
-        if len(attachments) != 1:
-            return False
-        image = attachments[0]
-        image_contents = await self.ocr(guild, image.url)
-        
-        pattern = r'2048 (\d+)\|'
-        match = re.search(pattern, image_contents)
-    
-        if match:
-            score = int(match.group(1))
-            if score < 2500:
-                dkp = 3
-            elif score < 5000:
-                dkp = 5
-            else:
-                dkp = 10
-
-            truth = await find_faction(dkp, guild, message)
-                
-            return truth
-                
-        else:
-            return False
-
-    async def worLdle_score(self, guild: discord.Guild, message: discord.Message):
-        dkp = 0
-        contents = message.content
-        
-        pattern = r'\)\s(\d)/6\s\('
-        match = re.search(pattern, content)
-        
-        if match:
-            score = int(match.group(1))
-            if score == 1:
-                dkp = 10
-            elif score == 2 or score == 3:
-                dkp = 5
-            else:
-                dkp = 2
-
-            if '🧭' in contents:
-                dkp += 1
-            if '⭐' in contents:
-                dkp += 1
-            if '🚩' in contents:
-                dkp += 1
-            if '🔤' in contents:
-                dkp += 1
-            if '👫' in contents:
-                dkp += 1
-            if '🪙' in contents:
-                dkp += 1
-            if '🗣️' in contents:
-                dkp += 1
-            if '📐' in contents:
-                dkp += 1
-            if '🏙️' in contents:
-                dkp += 1
-                
-            truth = await find_faction(dkp, guild, message)
-                
-            return truth
-                
-        else:
-            return False
-
-    async def globle_score(self, guild: discord.Guild, message: discord.Message):
-        dkp = 0
-        content = message.content
-
-        pattern = r'_square:\s*=\s*(\d+)'
-        match = re.search(pattern, content)
-
-        if match:
-            
-            score = int(match.group(1))
-            if score <= 5:
-                dkp = 5
-            elif score <= 10:
-                dkp = 3
-            else:
-                dkp = 1
-
-            truth = await find_faction(dkp, guild, message)
-                
-            return truth
-                
-        else:
-            return False
-
-    async def dino_score(self, guild: discord.Guild, message: discord.Message):
-        dkp = 0
-        attachments = message.attachments
-        if len(attachments) != 1:
-            return False
-        image = attachments[0]
-        image_contents = await self.ocr(guild, image.url)
-
-        pattern = r'HI (\d+) '
-        match = re.search(pattern, image_contents)
-
-        if match:
-            score_raw = match.group(1)
-            
-            truth = await find_faction(dkp, guild, message)
-            
-            return truth
-        
-        else:
-            return False
-
-    async def edge_surf_score(self, guild: discord.Guild, message: discord.Message):
-        dkp = 0
-        attachments = message.attachments
-        if len(attachments) != 1:
-            return False
-        image = attachments[0]
-        image_contents = await self.ocr(guild, image.url)
-
-        pattern = r'(\d+)m'
-        match = re.search(pattern, image_contents)
-
-        if match:
-            score = int(match.group(1))
-
-            if score > 5000:
-                dkp = 20
-            elif score > 2000:
-                dkp = 10
-            else:
-                dkp = 3
-
-            truth = await find_faction(dkp, guild, message)
-                
-            return truth
-        
-        else:
-            return False
-
-    async def slitherio_score(self, guild: discord.Guild, message: discord.Message):
-        dkp = 0
-        attachments = message.attachments
-        if len(attachments) != 1:
-            return False
-        image = attachments[0]
-        image_contents = await self.ocr(guild, image.url)
-
-        pattern = r'was (\d+)'
-        match = re.search(pattern, text)
-
-        if match:
-            score = int(match.group(1))
-
-            if score > 5000:
-                dkp = 20
-            elif score > 2500:
-                dkp = 10
-            else:
-                dkp = 5
-
-            truth = await find_faction(dkp, guild, message)
-                
-            return truth
-        
-        else:
-            return False
-
-    async def wordle_score(self, guild: discord.Guild, message: discord.Message):
-        content = message.content
 
-        pattern = r'\s(\w)\/'
-        match = re.search(pattern, content)
+    def _quest_day_done(self, guild_id, task):
+        del self._quest_days[guild_id]
+        if not task.cancelled() and task.exception():
+            print(f"A guild's quest job failed: {task.exception()!r}")
+
+    async def bounded(self, job):
+        """Run a per-guild job once fewer than QUEST_FANOUT are running."""
+        async with self._quest_fanout:
+            return await job
+
+    async def fan_out(self, jobs):
+        """Run per-guild jobs concurrently under the shared bound; one guild failing doesn't stop the rest."""
+        for result in await asyncio.gather(*(self.bounded(job) for job in jobs), return_exceptions=True):
+            if isinstance(result, Exception):
+                print(f"A guild's quest job failed: {result!r}")
+
+    async def run_quest_day(self, guild, settings, now):
+        """Close the current quest by scoring it up to `now`, the close time, then post the next one."""
+        # claim the day first, so a failing guild isn't retried on every tick
+        await self.config.guild(guild).last_quest_day.set(now.date().isoformat())
+        if settings["quest_count"] > 0 and settings["current_quest"]:
+            await self.fetch_messages(settings["quests_channel_id"], guild, settings.get("quest_posted_at"), now)
+        await self.post_quest(guild, settings, now.strftime("%A").lower())
 
-        if match:
-
-            score_str = match.group(1)
-            if score.isdigit():
-                score = int(score_str)
-
-                if score <= 3:
-                    dkp = 10
-                else:
-                    dkp = 5
-            else:
-                dkp = 3
-        else:
-            return False
-
-        truth = await find_faction(dkp, guild, message)
-
-        return truth
-
-    async def connections_score(self, guild: discord.Guild, message: discord.Message):
-        content = message.content
-
-        wins = ["🟩🟩🟩🟩","🟨🟨🟨🟨","🟪🟪🟪🟪", "🟦🟦🟦🟦"]
-
-        num_wins = 0
-
-        for win in wins:
-            if win in content:
-                num_wins += 1
-
-        if num_wins == 4:
-            num_squares = content.count("_square:")
-            num_guesses = round(num_squares/4) # there should never need to be rounding but this just prevents errors even in messed up content
-            if num_guesses <= 6:
-                dkp = 10
-            else:
-                dkp = 5
-        else:
-            dkp = 3
-
-        truth = await find_faction(dkp, guild, message)
-
-        return truth
-
-    async def semantle_score(self, guild: discord.Guild, message: discord.Message):
-        content = message.content
-
-        pattern = r':white_check_mark:\s*(\d+)\s*Guesses'
-
-        match = re.search(pattern, content)
-
-        if match:
-            score = match.group(1)
-            score= int(score)
-            if score < 30:
-                dkp = 20
-            elif score < 50:
-                dkp = 10
-            else:
-                dkp = 3
-        else:
-            if ":x:" in content:
-                dkp = 3
-            else:
-                return False
-
-        truth = await find_faction(dkp, guild, message)
-
-        return truth
-
-    async def tetrio_score(self, guild: discord.Guild, message: discord.Message):
-        dkp = 0
-        attachments = message.attachments
-        if len(attachments) != 1:
-            return False
-        image = attachments[0]
-        image_contents = await self.ocr(guild, image.url)
-
-        pattern = r'FINAL SCORE\n([\d,]+)'
-
-        match = re.search(pattern, image_contents)
-
-        if match:
-            score = int("".join(match.group(1).split(",")))
-            if score > 50000:
-                dkp = 20
-            elif score > 20000:
-                dkp = 10
-            else:
-                dkp = 5
-        else:
-            return False
-
-        truth = await find_faction(dkp, guild, message)
-
-        return truth
-
-    async def suika_score(self, guild: discord.Guild, message: discord.Message):
-        fruit_colors = {
-                "Cherry": ([168, 125, 223], [174, 216, 240]),    
-                "Strawberry": ([5, 165, 223], [7, 236, 244]),
-                "Grape": ([143, 133, 247], [144, 200, 255]),
-                "Dekopon": ([16, 156, 255], [18, 198, 255]),  
-                "Orange": ([10, 156, 227], [14, 216, 249]),
-                "Apple": ([175, 103, 249], [179, 212, 255]),
-                "Pear": ([25, 150, 228], [27, 235, 246]),
-                "Peach": ([151, 100, 255], [160, 255, 255]),
-                "Pineapple": ([23, 235, 242], [29, 244, 255]),
-                "Melon": ([40, 163, 248], [56, 240, 255]),
-                "Watermelon": ([44, 219, 151], [60, 255, 207]), 
-        }
-        
-        dkp = 0
-        attachments = message.attachments
-        if len(attachments) != 1:
-            return False
-        
-        image = attachments[0]
-        hsv_image = await asyncio.to_thread(cv2.cvtColor, image, cv2.COLOR_BGR2HSV)
-    
-        highest_fruit = None
-        
-        for fruit, (lower, upper) in fruit_colors.items():
-            lower_bound = np.array(lower, dtype=np.uint8)
-            upper_bound = np.array(upper, dtype=np.uint8)
-
-            # Run cv2.inRange in a separate thread
-            mask = await asyncio.to_thread(cv2.inRange, hsv_image, lower_bound, upper_bound)
-
-            # Run cv2.findContours in a separate thread
-            contours, _ = await asyncio.to_thread(cv2.findContours, mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-
-            if contours:
-                highest_fruit = fruit  # Update the highest detected fruit
-            else:
-                break  # Stop checking further if a fruit is missing
-        
-        if highest_fruit == "Peach":
-            dkp = 3
-        elif highest_fruit == "Pineapple":
-            dkp = 5
-        elif highest_fruit == "Melon":
-            dkp = 7
-        elif highest_fruit == "Watermelon":
-            dkp = 10
-        else:
-            dkp = 1
+    async def send_daily_message(self):
+        """Post a new quest in every guild right away."""
+        print("Executing quest task")
+        all_settings = await self.config.all_guilds()
+        await self.fan_out(
+            self.post_quest(guild, settings, _local_now(settings["timezone"]).strftime("%A").lower())
+            for guild, settings in ((self.bot.get_guild(gid), st) for gid, st in all_settings.items())
+            if guild is not None
+        )
 
-        truth = await find_faction(dkp, guild, message)
+    async def post_quest(self, guild, settings, day):
+        channel = self.bot.get_channel(settings["quests_channel_id"])
+        role_id = settings["quests_role_id"]
+        if not channel:
+            print("Please set the quests channel id.")
+            return
+        if not role_id:
+            print("Please set the quests role id.")
+            return
+        duple = await self.write_quest(day)
+        message = duple[1]
+        await channel.send(f"<@&{role_id}>\n{message}")
+        group = self.config.guild(guild)
+        await group.quest_count.set(settings["quest_count"] + 1)
+        await group.current_quest.set(duple[0])
+        await group.quest_posted_at.set(datetime.now(timezone.utc).timestamp())
+
+    async def write_quest(self, day=None):
+        """Generate a quest announcement depending on the day and return it as a string to be sent by the bot"""
+        day = day or datetime.now().strftime("%A").lower()
 
-        return truth 
+        self.catalog.refresh()
+        game = random.choice(self.catalog.games(day))  # Choose a random game
+        return [game, self.catalog.descriptions[game]]
 
-    async def find_faction(self, dkp, guild, message):
-        roles = await self.config.guild(guild).faction_roles()
-        scores = await self.config.guild(guild).faction_scores()
-        user_role = None
-        for role in roles.values():
-            if role in message.author.roles:
-                user_role = role
-                break
+    async def score_quests(self):
+        """score the current quest in every guild that has one"""
+        all_settings = await self.config.all_guilds()
+        await self.fan_out(
+            self.fetch_messages(settings["quests_channel_id"], guild, settings.get("quest_posted_at"))
+            for guild, settings in ((self.bot.get_guild(gid), st) for gid, st in all_settings.items())
+            if guild is not None and settings.get("quest_count", 0) > 0
+        )
 
-        if user_role:
-            original_score = scores[user_role.name]
-            await self.config.guild(guild).faction_scores.set(scores | {user_role.name: original_score + dkp})
-            return True
+    async def fetch_messages(self, channel_id, guild, posted_at=None, closed_at=None):
+        """get the messages posted while the quest was open and score them with a pool of workers"""
+        channel = self.bot.get_channel(channel_id)
+        if channel is None:
+            return
+        if posted_at:
+            last_quest = datetime.fromtimestamp(posted_at, tz=timezone.utc)
         else:
+            last_quest = datetime.now(timezone.utc) - timedelta(hours=23, minutes=59)
+        current_quest = await self.config.guild(guild).current_quest()
+        worker_count = await self.config.guild(guild).score_workers()
+
+        # the queue is bounded so history is only read as fast as the workers score it
+        queue = asyncio.Queue(maxsize=worker_count * 2)
+
+        async def worker():
+            while True:
+                message = await queue.get()
+                if message is None:
+                    return
+                await self.score_message(guild, ledger, message, str(current_quest))
+
+        if guild.id not in self._ledgers:
+            self._ledgers.setdefault(guild.id, await self.new_ledger(guild))
+        ledger = self._ledgers[guild.id]
+        self._ledger_runs[guild.id] += 1
+        workers = [asyncio.create_task(worker()) for _ in range(worker_count)]
+        try:
+            async for message in channel.history(limit=None, after=last_quest, before=closed_at):
+                await queue.put(message)
+            for _ in workers:
+                await queue.put(None)
+            await asyncio.gather(*workers)
+        finally:
+            for task in workers:
+                task.cancel()
+            try:
+                await self.flush_ledger(guild, ledger)
+            finally:
+                # dropped only once every run sharing it has flushed, so a run that
+                # starts afterwards loads all of their results from Config
+                self._ledger_runs[guild.id] -= 1
+                if not self._ledger_runs[guild.id]:
+                    del self._ledger_runs[guild.id]
+                    del self._ledgers[guild.id]
+
+    async def new_ledger(self, guild):
+        group = self.config.guild(guild)
+        legacy = await group.scored_messages()
+        if legacy:
+            await self.scored_store.put(guild.id, legacy)
+            await group.scored_messages.clear()
+        scored = await self.scored_store.get(guild.id, since=time.time() - SCORED_RETENTION)
+        return FactionLedger(group, await group.faction_roles(), scored, self.scored_store, guild.id)
+
+    async def flush_ledger(self, guild, ledger):
+        async with self._score_locks[guild.id]:
+            await ledger.flush()
+
+    async def score_message(self, guild, ledger, message: discord.Message, quest_name: str):
+        """score one submission and react to it with the result, unless an earlier run already did"""
+        # claimed before the slow part, so an overlapping run sharing the ledger skips it
+        if not ledger.claim(message.id):
+            return
+        try:
+            truth, score = await self.scored_with_retries(guild, message, quest_name, ledger)
+        except asyncio.CancelledError:
+            ledger.release(message.id)
+            raise
+        except Exception as e:
+            # left unmarked, so a rerun over the same quest still picks it up, and flagged
+            # so the member and mods can see it wasn't scored
+            ledger.release(message.id)
+            print(f"Couldn't score message {message.id}: {e}")
+            await self.react(message, "⚠️")
+            return
+        ledger.mark(message.id, quest_name, truth, score)
+        await self.react(message, "✅" if truth else "❌")
+
+    async def scored_with_retries(self, guild, message: discord.Message, quest_name: str, ledger=None):
+        """scored(), retrying failed screenshot downloads with exponential backoff"""
+        for attempt in range(DOWNLOAD_RETRIES):
+            try:
+                return await self.scored(guild, message, quest_name, ledger)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                print(f"Download for message {message.id} failed ({e!r}), retrying.")
+                await asyncio.sleep(DOWNLOAD_BACKOFF * 2 ** attempt)
+        return await self.scored(guild, message, quest_name, ledger)
+
+    async def react(self, message: discord.Message, emoji: str):
+        try:
+            await message.add_reaction(emoji)
+        except discord.HTTPException as e:
+            print(f"Couldn't react to message {message.id}: {e}")
+
+    async def scored(self, guild, message: discord.Message, quest_name: str, ledger=None):
+        """score a submission to the quest of the day by its game's rule; returns (accepted, score)
+
+        DKP goes to `ledger`, the scoring run's, or straight to Config without one."""
+        rule = rule_for(quest_name)
+        if rule is None:
+            return False, None
+        raw = await self.read_submission(rule, message)
+        score, dkp = rule.evaluate(raw, message.content)
+        if dkp is None:
+            return False, score
+        return await self.find_faction(dkp, guild, message, ledger), score
+
+    async def read_submission(self, rule, message: discord.Message):
+        """the raw score of a submission, read from wherever the game's rule says it is"""
+        if rule.source == TEXT:
+            return rule.read_text(message.content)
+        if len(message.attachments) != 1:
+            return None
+        attachment = message.attachments[0]
+        if rule.source == OCR:
+            return await self._read_score(attachment, rule.name, rule.pattern, rule.ocr_profile)
+        return await self.read_fruits(rule.name, attachment)
+
+    async def read_fruits(self, game, attachment):
+        """rank of the highest Suika fruit on a screenshot (0 if none), or None if it can't be read"""
+        image = await self.download_attachment(attachment)
+        if image is None:
+            return None
+        stats = self.ocr_stats[game]
+        stats["reads"] += 1
+        result = await asyncio.to_thread(detect_fruits, image)
+        if result is None:
+            stats["misses"] += 1
+            return None
+        stats["cv_tries"] += 1
+        stats["cv_seconds"] += result.decode_seconds + result.classify_seconds
+        return str(fruit_rank(result.highest) if result.highest else 0)
+
+    async def find_faction(self, dkp, guild, message, ledger=None):
+        """credit the author's faction with `dkp`; False if they aren't in one"""
+        standalone = ledger is None  # scored outside a run, so nothing else will flush it
+        if standalone:
+            ledger = await self.new_ledger(guild)
+
+        faction = ledger.faction_of(message.author)
+        if faction is None:
             return False
+        ledger.add(faction, dkp, message.id)
+        if standalone:
+            await self.flush_ledger(guild, ledger)
+        return True
         
     @is_owner_overridable()
     @commands.command()
@@ -553,7 +485,7 @@ class Quests(commands.Cog):
 
         if role.id not in roles:
             roles[role.id] = {'name': role.name}
-            scores[role.id] = 0
+            scores.setdefault(str(role.id), 0)
 
             await self.config.guild(ctx.guild).faction_roles.set(roles)
             await self.config.guild(ctx.guild).faction_scores.set(scores)
@@ -601,13 +533,62 @@ class Quests(commands.Cog):
 
         if role.id in roles:
             del roles[role.id]
-            del scores[role.id]
+            scores.pop(role.id, None)
             await self.config.guild(ctx.guild).faction_roles.set(roles)
             await self.config.guild(ctx.guild).faction_scores.set(scores)
             await ctx.send(f"Faction `{role.name}` removed.")
         else:
             await ctx.send("Faction not found.")
 
+    @is_owner_overridable()
+    @commands.command()
+    async def set_score_workers(self, ctx, workers: int):
+        """Set how many quest submissions are scored at once."""
+        workers = max(1, min(workers, MAX_SCORE_WORKERS))
+        await self.config.guild(ctx.guild).score_workers.set(workers)
+        await ctx.send(f"Scoring {workers} submissions at a time.")
+
+    @is_owner_overridable()
+    @commands.command()
+    async def ocr_stats(self, ctx):
+        """Shows how each game's screenshots were read since the cog loaded."""
+        if not self.ocr_stats:
+            await ctx.send("No screenshots have been read yet.")
+            return
+        lines = []
+        for game, st in sorted(self.ocr_stats.items()):
+            line = f"**{game}**: {st['reads']} reads, {st['cache_hits']} cached"
+            if st["cv_tries"]:
+                line += f", detector {st['cv_seconds'] / st['cv_tries']:.2f}s avg"
+            if st["cropped_tries"]:
+                line += (f", cropped {st['cropped_hits']}/{st['cropped_tries']} hits"
+                         f" ({st['cropped_seconds'] / st['cropped_tries']:.2f}s avg)")
+            if st["full_tries"]:
+                line += (f", full image {st['full_hits']}/{st['full_tries']} hits"
+                         f" ({st['full_seconds'] / st['full_tries']:.2f}s avg)")
+            lines.append(line + f", {st['misses']} unreadable")
+        await ctx.send("\n".join(lines))
+
+    @is_owner_overridable()
+    @commands.command()
+    async def set_quest_time(self, ctx, time_of_day: str, tz: str = None):
+        """Set when each day's quest closes and the next one is posted, e.g. `18:30 Europe/Berlin`."""
+        parsed = _parse_quest_time(time_of_day)
+        if parsed is None:
+            await ctx.send("Give the time as HH:MM, e.g. `18:30`.")
+            return
+        if tz is not None:
+            try:
+                ZoneInfo(tz)
+            except (ZoneInfoNotFoundError, ValueError):
+                await ctx.send(f"Unknown timezone `{tz}`. Use an IANA name like `America/New_York`.")
+                return
+            await self.config.guild(ctx.guild).timezone.set(tz)
+        else:
+            tz = await self.config.guild(ctx.guild).timezone()
+        await self.config.guild(ctx.guild).quest_time.set(f"{parsed[0]:02d}:{parsed[1]:02d}")
+        await ctx.send(f"Quests will close and be posted daily at {parsed[0]:02d}:{parsed[1]:02d} ({tz}).")
+
     @is_owner_overridable()
     @commands.command()
     async def score_now(self, ctx):
@@ -624,11 +605,16 @@ class Quests(commands.Cog):
     @commands.command()
     async def show_scores(self, ctx):
         """Shows the scores for each faction"""
+        roles = await self.config.guild(ctx.guild).faction_roles()
         score_log = await self.config.guild(ctx.guild).faction_scores()
-        message = ""
-        for faction, score in score_log:
-            message += f"**{faction}**: {score} DKP"
-        ctx.send(message)
+        if not roles:
+            await ctx.send("No factions have been created yet.")
+            return
+        lines = []
+        for role_id, role_info in roles.items():
+            score = score_log.get(str(role_id), 0)
+            lines.append(f"**{role_info.get('name', 'Unknown')}**: {score} DKP")
+        await ctx.send("\n".join(lines))
 
     @commands.Cog.listener()
     async def on_message(self, message):
@@ -0,0 +1,89 @@
+import csv
+import os
+import re
+from typing import Dict, List, Optional, Tuple
+
+GAMES_BY_DAY = "games-by-day.csv"
+GAMES_TO_DESCS = "games-to-descs.csv"
+
+
+def game_key(name: str) -> str:
+    """Loose form of a game name, so "Tetrio" in one file finds "Tetr.io" in the other."""
+    return re.sub(r"[^a-z0-9]", "", name.lower())
+
+
+class QuestCatalog:
+    """Games per weekday and each game's quest description, read from the files next to the cog.
+
+    Everything is loaded into memory once; refresh() reloads it when any of the files
+    has changed on disk, so edits to the CSVs or descriptions apply without a reload.
+    """
+
+    def __init__(self, root):
+        self.root = str(root)
+        self.by_day: Dict[str, List[str]] = {}
+        self.descriptions: Dict[str, str] = {}
+        # files the catalog was built from, and their mtimes at the time
+        self._files = [GAMES_BY_DAY, GAMES_TO_DESCS]
+        self._stamp = None
+        self.refresh()
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.root, name)
+
+    def _current_stamp(self) -> Tuple[Optional[float], ...]:
+        stamp = []
+        for name in self._files:
+            try:
+                stamp.append(os.stat(self._path(name)).st_mtime)
+            except FileNotFoundError:
+                stamp.append(None)
+        return tuple(stamp)
+
+    def refresh(self) -> bool:
+        """Reload the catalog if any of its files changed. Returns whether it reloaded."""
+        if self._stamp is None:
+            self._load()
+        else:
+            stamp = self._current_stamp()
+            if stamp == self._stamp:
+                return False
+            try:
+                self._load()
+            except (OSError, KeyError, csv.Error) as e:
+                # keep serving the last good catalog, e.g. while a file is half-written
+                print(f"Quest catalog: couldn't reload ({e}), keeping the previous one.")
+                self._stamp = stamp
+                return False
+        self._stamp = self._current_stamp()
+        return True
+
+    def _load(self):
+        # the descriptions CSV starts with a byte order mark
+        with open(self._path(GAMES_TO_DESCS), newline="", encoding="utf-8-sig") as f:
+            locations = {row["Game"]: row["description location"] for row in csv.DictReader(f) if row["Game"]}
+
+        descriptions = {}
+        names = {}
+        for game, location in locations.items():
+            with open(self._path(location), encoding="utf-8") as f:
+                descriptions[game] = f.read()
+            names[game_key(game)] = game
+
+        by_day = {}
+        with open(self._path(GAMES_BY_DAY), newline="", encoding="utf-8-sig") as f:
+            for row in csv.DictReader(f):
+                for day, game in row.items():
+                    if not game:
+                        continue
+                    if game_key(game) not in names:
+                        print(f"Quest catalog: no description for {game}, leaving it out of {day}.")
+                        continue
+                    by_day.setdefault(day.lower(), []).append(names[game_key(game)])
+
+        self.descriptions = descriptions
+        self.by_day = by_day
+        self._files = [GAMES_BY_DAY, GAMES_TO_DESCS, *locations.values()]
+
+    def games(self, day: str) -> List[str]:
+        return self.by_day.get(day.lower(), [])
@@ -0,0 +1,85 @@
+import time
+from collections import Counter
+from typing import Dict, Optional
+
+# how long processed submissions are remembered; scoring only looks back a day
+SCORED_RETENTION = 7 * 24 * 60 * 60
+
+
+class FactionLedger:
+    """DKP earned by each faction during one scoring run, written to Config in one go.
+
+    Faction roles are read once into a role id -> faction map, so finding a member's
+    faction is a set intersection with their role ids. Deltas only accumulate in memory
+    until flush(), which adds them to the stored scores in a single Config write.
+
+    The ledger also knows which submissions were already processed, with their result
+    and the DKP they earned, so a rerun skips them instead of scoring them twice; those
+    live in a ScoredStore (`store`, for the guild `guild_id`) rather than Config. A
+    submission is claimed before it's scored, so overlapping runs sharing the ledger
+    don't both credit it.
+    """
+
+    def __init__(self, group, faction_roles: Dict[str, dict], scored_messages: Dict[str, dict],
+                 store=None, guild_id: Optional[int] = None):
+        self._group = group
+        self._store = store
+        self._guild_id = guild_id
+        # Config keys are strings; the order is the order factions were created in
+        self.factions = [str(role_id) for role_id in faction_roles]
+        self._role_ids = {int(role_id): str(role_id) for role_id in faction_roles}
+        self.deltas = Counter()
+        self.scored = scored_messages
+        self._new_scored = {}
+        self._credited = {}  # message id -> (faction, dkp) until the message is marked
+        self._in_flight = set()  # message ids claimed by a run and not marked or released yet
+
+    def faction_of(self, member) -> Optional[str]:
+        """The faction (its role id, as stored) of a member, or None if they're in none."""
+        matches = self._role_ids.keys() & {role.id for role in getattr(member, "roles", ())}
+        if not matches:
+            return None
+        # someone holding several faction roles scores for the oldest faction
+        return min((self._role_ids[r] for r in matches), key=self.factions.index)
+
+    def add(self, faction: str, dkp: int, message_id: Optional[int] = None):
+        self.deltas[faction] += dkp
+        if message_id is not None:
+            self._credited[message_id] = (faction, dkp)
+
+    def seen(self, message_id: int) -> bool:
+        return str(message_id) in self.scored or message_id in self._in_flight
+
+    def claim(self, message_id: int) -> bool:
+        """Reserve a submission for scoring; False if it was processed already or is being scored."""
+        if self.seen(message_id):
+            return False
+        self._in_flight.add(message_id)
+        return True
+
+    def release(self, message_id: int):
+        """Give a claimed submission back unmarked, undoing any DKP it was credited, so a later run retries it."""
+        self._in_flight.discard(message_id)
+        credited = self._credited.pop(message_id, None)
+        if credited:
+            faction, dkp = credited
+            self.deltas[faction] -= dkp
+
+    def mark(self, message_id: int, game: str, accepted: bool, score=None):
+        """Record a processed submission so later runs skip it."""
+        self._in_flight.discard(message_id)
+        faction, dkp = self._credited.pop(message_id, (None, 0))
+        entry = {"game": game, "accepted": accepted, "score": score, "faction": faction, "dkp": dkp, "at": time.time()}
+        self.scored[str(message_id)] = entry
+        self._new_scored[str(message_id)] = entry
+
+    async def flush(self):
+        """Add the accumulated deltas to the stored scores and store newly processed submissions."""
+        deltas, self.deltas = self.deltas, Counter()
+        new_scored, self._new_scored = self._new_scored, {}
+        if deltas:
+            async with self._group.faction_scores() as scores:
+                for faction, dkp in deltas.items():
+                    scores[faction] = scores.get(faction, 0) + dkp
+        if new_scored:
+            await self._store.put(self._guild_id, new_scored, prune_before=time.time() - SCORED_RETENTION)
@@ -0,0 +1,78 @@
+import asyncio
+import json
+import sqlite3
+import threading
+import time
+from typing import Dict, NamedTuple, Optional
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS ocr (
+    attachment_id INTEGER PRIMARY KEY,
+    sha256 TEXT NOT NULL,
+    text TEXT NOT NULL,
+    parsed TEXT NOT NULL DEFAULT '{}',
+    accessed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ocr_by_hash ON ocr (sha256);
+"""
+
+
+class OcrEntry(NamedTuple):
+    text: str
+    # game -> [pattern, matched score or None]
+    parsed: Dict[str, list]
+
+
+class OcrCache:
+    """SQLite store of OCR text and parsed scores, keyed by attachment id and image hash.
+
+    Least recently used entries are dropped once there are more than `max_entries`.
+    Queries run in a worker thread so the event loop never waits on disk.
+    """
+
+    def __init__(self, path, max_entries: int = 5000):
+        self.path = str(path)
+        self.max_entries = max_entries
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+        self._lock = threading.Lock()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    async def _run(self, fn, *args):
+        def locked():
+            with self._lock:
+                return fn(*args)
+        return await asyncio.to_thread(locked)
+
+    def _get(self, column: str, key) -> Optional[OcrEntry]:
+        row = self._conn.execute(f"SELECT attachment_id, text, parsed FROM ocr WHERE {column} = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        with self._conn:
+            self._conn.execute("UPDATE ocr SET accessed_at = ? WHERE attachment_id = ?", (time.time(), row[0]))
+        return OcrEntry(row[1], json.loads(row[2]))
+
+    async def get(self, attachment_id: int) -> Optional[OcrEntry]:
+        return await self._run(self._get, "attachment_id", attachment_id)
+
+    async def get_by_hash(self, sha256: str) -> Optional[OcrEntry]:
+        """An entry for the same image bytes, e.g. a screenshot posted again."""
+        return await self._run(self._get, "sha256", sha256)
+
+    def _put(self, attachment_id: int, sha256: str, entry: OcrEntry):
+        with self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO ocr (attachment_id, sha256, text, parsed, accessed_at) VALUES (?,?,?,?,?)",
+                (attachment_id, sha256, entry.text, json.dumps(entry.parsed), time.time()),
+            )
+            self._conn.execute(
+                "DELETE FROM ocr WHERE rowid IN (SELECT rowid FROM ocr ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+
+    async def put(self, attachment_id: int, sha256: str, entry: OcrEntry):
+        await self._run(self._put, attachment_id, sha256, entry)
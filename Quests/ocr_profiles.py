@@ -0,0 +1,54 @@
+from typing import NamedTuple, Optional, Tuple
+
+import cv2
+import numpy as np
+
+
+class OcrProfile(NamedTuple):
+    """How to prepare a game's screenshot for a quick first OCR pass."""
+    # region holding the score, as (left, top, right, bottom) fractions of the image
+    roi: Tuple[float, float, float, float] = (0.0, 0.0, 1.0, 1.0)
+    grayscale: bool = True
+    threshold: bool = True  # Otsu binarization, flipped to dark text on a light background
+    max_width: int = 1000
+    # characters tesseract may output; must cover everything the game's regex needs
+    whitelist: Optional[str] = None
+    psm: int = 6  # a single uniform block of text
+
+
+DIGITS = "0123456789"
+
+
+def preprocess(image: bytes, profile: OcrProfile) -> Optional[bytes]:
+    """Crop, grayscale, downscale and binarize an encoded image. Returns PNG bytes, or None if it can't be decoded."""
+    flags = cv2.IMREAD_GRAYSCALE if profile.grayscale else cv2.IMREAD_COLOR
+    img = cv2.imdecode(np.frombuffer(image, dtype=np.uint8), flags)
+    if img is None:
+        return None
+
+    h, w = img.shape[:2]
+    left, top, right, bottom = profile.roi
+    img = img[int(top * h):int(bottom * h), int(left * w):int(right * w)]
+    if not img.size:
+        return None
+
+    if profile.max_width and img.shape[1] > profile.max_width:
+        scale = profile.max_width / img.shape[1]
+        img = cv2.resize(img, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+
+    if profile.threshold and profile.grayscale:
+        _, img = cv2.threshold(img, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+        # tesseract reads dark text on light backgrounds best
+        if img.mean() < 127:
+            img = cv2.bitwise_not(img)
+
+    ok, png = cv2.imencode(".png", img)
+    return png.tobytes() if ok else None
+
+
+def tesseract_options(profile: OcrProfile) -> dict:
+    """Keyword arguments for aiopytesseract.image_to_string."""
+    options = {"psm": profile.psm}
+    if profile.whitelist:
+        options["config"] = [("tessedit_char_whitelist", profile.whitelist)]
+    return options
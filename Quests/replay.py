@@ -0,0 +1,140 @@
+"""Offline replay of recorded quest submissions through the Quests scorers.
+
+Run from the repo root (in the bot's environment, with tesseract installed) with
+``python -m Quests.replay path/to/recordings``. The directory holds a
+``manifest.jsonl`` with one submission per line, screenshots next to it::
+
+    {"game": "Wordle", "content": "Wordle 1,234 3/6 ...", "expected_dkp": 10}
+    {"game": "Tetr.io", "image": "tetrio-52k.png", "expected_dkp": 20}
+
+Nothing talks to Discord: messages, members and the guild are stand-ins, DKP goes to an
+in-memory ledger, and the OCR cache is a fresh temporary one unless ``--cache`` is given.
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import tempfile
+import time
+from collections import Counter, defaultdict
+from types import SimpleNamespace
+
+from .Quests import Quests
+from .ledger import FactionLedger
+from .ocr_cache import OcrCache
+
+REPLAY_ROLE_ID = 1
+
+
+def load_manifest(root: str):
+    with open(os.path.join(root, "manifest.jsonl"), encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def attachment_id(path: str) -> int:
+    """A stand-in attachment id derived from the screenshot's bytes.
+
+    The OCR cache is keyed by attachment id first, so ids must not depend on where an
+    image sits in the manifest, or a reused --cache would serve another image's read.
+    """
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+    except OSError:
+        data = path.encode()  # the download fails later and is reported as an error
+    # sqlite integers are signed 64-bit
+    return int.from_bytes(hashlib.sha256(data).digest()[:8], "big") >> 1
+
+
+def fake_message(i: int, root: str, record: dict):
+    """A stand-in for discord.Message with what the scorers read. Attachment urls are local paths."""
+    attachments = []
+    if record.get("image"):
+        path = os.path.join(root, record["image"])
+        attachments.append(SimpleNamespace(id=attachment_id(path), url=path, filename=os.path.basename(path)))
+    author = SimpleNamespace(id=i, roles=[SimpleNamespace(id=REPLAY_ROLE_ID)])
+    return SimpleNamespace(id=i, content=record.get("content", ""), attachments=attachments, author=author)
+
+
+def replay_cog(cache_path: str) -> Quests:
+    """A Quests cog wired for replay.
+
+    Config needs a running bot, so __init__ is skipped and only the state the scoring
+    path uses is set up; screenshots are read from disk instead of downloaded.
+    """
+    cog = Quests.__new__(Quests)
+    cog.bot = None
+    cog._session = None
+    cog._score_locks = defaultdict(asyncio.Lock)
+    cog.ocr_cache = OcrCache(cache_path)
+    cog.ocr_stats = defaultdict(Counter)
+
+    async def download(url, max_bytes=None):
+        with open(url, "rb") as f:
+            return f.read()
+
+    cog.download = download
+    return cog
+
+
+def percentile(values, q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+async def replay(root: str, cache_path: str):
+    records = load_manifest(root)
+    cog = replay_cog(cache_path)
+    guild = SimpleNamespace(id=0)
+    ledger = FactionLedger(None, {str(REPLAY_ROLE_ID): {"name": "Replay"}}, {})
+
+    latencies = defaultdict(list)
+    mismatches, errors = [], []
+    expected_total, actual_total = Counter(), Counter()
+    for i, record in enumerate(records, start=1):
+        game = record["game"]
+        message = fake_message(i, root, record)
+        started = time.perf_counter()
+        try:
+            accepted, score = await cog.scored(guild, message, game, ledger)
+        except Exception as e:
+            errors.append((i, game, repr(e)))
+            continue
+        latencies[game].append(time.perf_counter() - started)
+        ledger.mark(message.id, game, accepted, score)
+        dkp = ledger.scored[str(message.id)]["dkp"]
+        actual_total[game] += dkp
+        if "expected_dkp" in record:
+            expected_total[game] += record["expected_dkp"]
+            if record["expected_dkp"] != dkp:
+                mismatches.append((i, game, record.get("image") or record.get("content", "")[:40], record["expected_dkp"], dkp, score))
+    cog.ocr_cache.close()
+
+    print(f"{'game':<16}{'n':>5}{'msgs/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'ocr/cv':>9}{'dkp exp':>9}{'dkp got':>9}")
+    for game, times in sorted(latencies.items()):
+        total = sum(times)
+        st = cog.ocr_stats.get(game, Counter())
+        image_time = st["cropped_seconds"] + st["full_seconds"] + st["cv_seconds"]
+        print(
+            f"{game:<16}{len(times):>5}{len(times) / total:>10,.1f}"
+            f"{percentile(times, 0.5) * 1000:>10.1f}{percentile(times, 0.99) * 1000:>10.1f}"
+            f"{image_time / total:>9.0%}{expected_total[game]:>9}{actual_total[game]:>9}"
+        )
+    for i, game, what, expected, actual, score in mismatches:
+        print(f"mismatch #{i} {game} ({what}): expected {expected} DKP, got {actual} (score {score})")
+    for i, game, error in errors:
+        print(f"error #{i} {game}: {error}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("directory", help="directory with manifest.jsonl and the screenshots it names")
+    parser.add_argument("--cache", help="OCR cache to use (default: a fresh temporary one)")
+    args = parser.parse_args(argv)
+    with tempfile.TemporaryDirectory() as tmp:
+        asyncio.run(replay(args.directory, args.cache or os.path.join(tmp, "ocr-cache.sqlite3")))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+import re
+from typing import Callable, Dict, NamedTuple, Optional, Pattern, Tuple
+
+from .catalog import game_key
+from .ocr_profiles import DIGITS, OcrProfile
+from .suika import FRUITS
+
+TEXT, OCR, CV = "text", "ocr", "cv"
+
+
+def to_int(raw: str) -> Optional[int]:
+    """A score as read from a submission, allowing thousands separators."""
+    raw = raw.replace(",", "")
+    return int(raw) if raw.isdigit() else None
+
+
+class GameRule(NamedTuple):
+    """How one game's submissions are read and turned into DKP.
+
+    The score is read from the message text, the OCR'd screenshot or the image itself
+    (`source`), via `pattern`'s first group or `extract`; screenshots with an
+    `ocr_profile` get a cropped OCR pass first. `ladder` holds (bound, dkp)
+    steps, best first: the first bound the score reaches (or stays under, for games
+    where lower is better) sets the DKP, otherwise it's `base_dkp`.
+    """
+    name: str
+    source: str
+    pattern: Optional[Pattern] = None
+    extract: Optional[Callable[[str], Optional[str]]] = None
+    ocr_profile: Optional[OcrProfile] = None
+    normalize: Callable[[str], Optional[int]] = to_int
+    ladder: Tuple[Tuple[int, int], ...] = ()
+    lower_is_better: bool = False
+    base_dkp: int = 0
+    # DKP for a submission whose score can't be read (a failed Wordle, say); None rejects it
+    unparsed_dkp: Optional[int] = None
+    # when the pattern doesn't match at all, this marker still counts as an unparsed submission
+    fallback_marker: Optional[str] = None
+    # +1 DKP for each of these found in the message
+    bonus_emojis: frozenset = frozenset()
+    aliases: Tuple[str, ...] = ()
+
+    def read_text(self, text: str) -> Optional[str]:
+        if self.extract:
+            return self.extract(text)
+        match = self.pattern.search(text)
+        return match.group(1) if match else None
+
+    def evaluate(self, raw: Optional[str], text: str = "") -> Tuple[Optional[int], Optional[int]]:
+        """(score, dkp) for a submission; dkp is None when it doesn't count."""
+        if raw is None:
+            if self.fallback_marker and self.fallback_marker in text:
+                return None, self.unparsed_dkp
+            return None, None
+        score = self.normalize(raw)
+        if score is None:
+            return None, self.unparsed_dkp
+        dkp = self.base_dkp
+        for bound, points in self.ladder:
+            if (score <= bound) if self.lower_is_better else (score >= bound):
+                dkp = points
+                break
+        dkp += sum(1 for emoji in self.bonus_emojis if emoji in text)
+        return score, dkp
+
+
+CONNECTIONS_SOLVED = ("🟩🟩🟩🟩", "🟨🟨🟨🟨", "🟪🟪🟪🟪", "🟦🟦🟦🟦")
+CONNECTIONS_SQUARE = re.compile(r"[🟩🟨🟪🟦]|_square:")
+
+
+def connections_guesses(text: str) -> Optional[str]:
+    """Guesses used if every group was found, "X" if the grid is unfinished, None if there's no grid."""
+    squares = len(CONNECTIONS_SQUARE.findall(text))
+    if not squares:
+        return None
+    if not all(row in text for row in CONNECTIONS_SOLVED):
+        return "X"
+    return str(round(squares / 4))
+
+
+def fruit_rank(fruit: str) -> int:
+    return FRUITS.index(fruit) + 1
+
+
+# Crops are generous since screenshot sizes vary; when the cropped pass misses the
+# regex, the full image is OCR'd as before.
+RULES = [
+    GameRule(
+        "2048", OCR, re.compile(r"2048 (\d+)\|"),
+        ocr_profile=OcrProfile(roi=(0.0, 0.0, 1.0, 0.4), whitelist=DIGITS + "| "),
+        ladder=((5000, 10), (2500, 5)), base_dkp=3,
+    ),
+    GameRule(
+        "Worldle", TEXT, re.compile(r"\)\s(\d)/6\s\("),
+        ladder=((1, 10), (3, 5)), lower_is_better=True, base_dkp=2,
+        bonus_emojis=frozenset(("🧭", "⭐", "🚩", "🔤", "👫", "🪙", "🗣️", "📐", "🏙️")),
+    ),
+    GameRule(
+        "Globle", TEXT, re.compile(r"_square:\s*=\s*(\d+)"),
+        ladder=((5, 5), (10, 3)), lower_is_better=True, base_dkp=1,
+        aliases=("Globle-capitals",),
+    ),
+    GameRule(
+        "Dinosaur Game", OCR, re.compile(r"HI (\d+) "),
+        ocr_profile=OcrProfile(roi=(0.4, 0.0, 1.0, 0.4), whitelist=DIGITS + "HI ", psm=7),
+        ladder=((2500, 20), (500, 10)), base_dkp=5,
+        aliases=("dino", "dino game"),
+    ),
+    GameRule(
+        "Edge Surfer", OCR, re.compile(r"(\d+)m"),
+        ocr_profile=OcrProfile(roi=(0.0, 0.0, 1.0, 0.35), whitelist=DIGITS + "m "),
+        ladder=((5001, 20), (2001, 10)), base_dkp=3,
+        aliases=("edge surf",),
+    ),
+    GameRule(
+        "Slither.io", OCR, re.compile(r"was (\d+)"),
+        ocr_profile=OcrProfile(roi=(0.0, 0.2, 1.0, 0.8)),
+        ladder=((5001, 20), (2501, 10)), base_dkp=5,
+    ),
+    GameRule(
+        "Wordle", TEXT, re.compile(r"\s(\w)/"),
+        ladder=((3, 10),), lower_is_better=True, base_dkp=5, unparsed_dkp=3,
+    ),
+    GameRule(
+        "Connections", TEXT, extract=connections_guesses,
+        ladder=((6, 10),), lower_is_better=True, base_dkp=5, unparsed_dkp=3,
+    ),
+    GameRule(
+        "Semantle", TEXT, re.compile(r":white_check_mark:\s*(\d+)\s*Guesses"),
+        ladder=((29, 20), (49, 10)), lower_is_better=True, base_dkp=3,
+        unparsed_dkp=3, fallback_marker=":x:",
+    ),
+    GameRule(
+        "Tetr.io", OCR, re.compile(r"FINAL SCORE\n([\d,]+)"),
+        ocr_profile=OcrProfile(roi=(0.1, 0.15, 0.9, 0.85), whitelist=DIGITS + ", FINALSCORE"),
+        ladder=((50001, 20), (20001, 10)), base_dkp=5,
+    ),
+    # the detector reports the rank of the highest fruit reached, cherry being 1
+    GameRule(
+        "Suika Game", CV,
+        ladder=(
+            (fruit_rank("Watermelon"), 10), (fruit_rank("Melon"), 7),
+            (fruit_rank("Pineapple"), 5), (fruit_rank("Peach"), 3),
+        ),
+        base_dkp=1,
+        aliases=("suika",),
+    ),
+]
+
+# loose game name (see catalog.game_key) -> rule, for names and aliases alike
+RULES_BY_KEY: Dict[str, GameRule] = {}
+for _rule in RULES:
+    for _name in (_rule.name, *_rule.aliases):
+        RULES_BY_KEY[game_key(_name)] = _rule
+
+
+def rule_for(game: str) -> Optional[GameRule]:
+    return RULES_BY_KEY.get(game_key(game))
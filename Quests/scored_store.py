@@ -0,0 +1,63 @@
+import asyncio
+import json
+import sqlite3
+import threading
+from typing import Dict
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS scored (
+    guild_id INTEGER NOT NULL,
+    message_id INTEGER NOT NULL,
+    scored_at REAL NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (guild_id, message_id)
+);
+CREATE INDEX IF NOT EXISTS scored_by_time ON scored (scored_at);
+"""
+
+
+class ScoredStore:
+    """SQLite store of processed quest submissions per guild: message id -> how it was scored.
+
+    Kept out of Config, which the quest clock bulk-reads every minute.
+    Queries run in a worker thread so the event loop never waits on disk.
+    """
+
+    def __init__(self, path):
+        self.path = str(path)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+        self._lock = threading.Lock()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    async def _run(self, fn, *args):
+        def locked():
+            with self._lock:
+                return fn(*args)
+        return await asyncio.to_thread(locked)
+
+    def _get(self, guild_id: int, since: float) -> Dict[str, dict]:
+        rows = self._conn.execute(
+            "SELECT message_id, data FROM scored WHERE guild_id = ? AND scored_at >= ?", (guild_id, since)
+        ).fetchall()
+        return {str(message_id): json.loads(data) for message_id, data in rows}
+
+    async def get(self, guild_id: int, since: float = 0) -> Dict[str, dict]:
+        """The guild's submissions processed at or after `since`, keyed by message id as a string."""
+        return await self._run(self._get, guild_id, since)
+
+    def _put(self, guild_id: int, entries: Dict[str, dict], prune_before: float):
+        with self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO scored (guild_id, message_id, scored_at, data) VALUES (?,?,?,?)",
+                [(guild_id, int(message_id), entry["at"], json.dumps(entry)) for message_id, entry in entries.items()],
+            )
+            self._conn.execute("DELETE FROM scored WHERE scored_at < ?", (prune_before,))
+
+    async def put(self, guild_id: int, entries: Dict[str, dict], prune_before: float = 0):
+        """Store processed submissions and drop every guild's entries older than `prune_before`."""
+        await self._run(self._put, guild_id, entries, prune_before)
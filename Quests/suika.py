@@ -0,0 +1,82 @@
+import time
+from typing import Dict, NamedTuple, Optional
+
+import cv2
+import numpy as np
+
+# Fruits from smallest to largest with their HSV ranges, as (lower, upper) triples
+FRUIT_COLORS = {
+    "Cherry": ([168, 125, 223], [174, 216, 240]),
+    "Strawberry": ([5, 165, 223], [7, 236, 244]),
+    "Grape": ([143, 133, 247], [144, 200, 255]),
+    "Dekopon": ([16, 156, 255], [18, 198, 255]),
+    "Orange": ([10, 156, 227], [14, 216, 249]),
+    "Apple": ([175, 103, 249], [179, 212, 255]),
+    "Pear": ([25, 150, 228], [27, 235, 246]),
+    "Peach": ([151, 100, 255], [160, 255, 255]),
+    "Pineapple": ([23, 235, 242], [29, 244, 255]),
+    "Melon": ([40, 163, 248], [56, 240, 255]),
+    "Watermelon": ([44, 219, 151], [60, 255, 207]),
+}
+FRUITS = list(FRUIT_COLORS)
+
+# screenshots are shrunk to this width before classifying; fruits are big flat blobs
+MAX_WIDTH = 480
+# a fruit counts as on the board when it covers at least this share of the pixels
+MIN_FRUIT_AREA = 0.0002
+
+
+def _lookup_tables():
+    """Bitmask tables with bit i set where fruit i's range includes the value: one indexed
+    by (hue, saturation), one by value. A pixel is fruit i when bit i is set in both."""
+    hue_sat = np.zeros((180, 256), dtype=np.uint16)
+    val = np.zeros(256, dtype=np.uint16)
+    for i, (lower, upper) in enumerate(FRUIT_COLORS.values()):
+        hue_sat[lower[0]:upper[0] + 1, lower[1]:upper[1] + 1] |= 1 << i
+        val[lower[2]:upper[2] + 1] |= 1 << i
+    return hue_sat, val
+
+
+HUE_SAT_LUT, VAL_LUT = _lookup_tables()
+# for every possible pixel bitmask, which fruits it includes
+_MASK_BITS = (np.arange(1 << len(FRUITS))[:, None] >> np.arange(len(FRUITS))) & 1
+
+
+class SuikaResult(NamedTuple):
+    highest: Optional[str]  # largest fruit reached without skipping one, None if not even a cherry
+    pixels: Dict[str, int]
+    decode_seconds: float
+    classify_seconds: float
+
+
+def detect_fruits(image: bytes) -> Optional[SuikaResult]:
+    """Find which fruits are on a Suika Game screenshot. None if the image can't be decoded.
+
+    The image is decoded and shrunk once, converted to HSV, and every pixel is classified
+    against all fruit ranges at once with the lookup tables; one bincount over the
+    resulting bitmasks gives each fruit's pixel count.
+    """
+    started = time.perf_counter()
+    img = cv2.imdecode(np.frombuffer(image, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if img is None:
+        return None
+    if img.shape[1] > MAX_WIDTH:
+        scale = MAX_WIDTH / img.shape[1]
+        # nearest neighbour so edges don't blend into colors no fruit has
+        img = cv2.resize(img, None, fx=scale, fy=scale, interpolation=cv2.INTER_NEAREST)
+    hsv = cv2.cvtColor(img, cv2.COLOR_BGR2HSV)
+    decoded = time.perf_counter()
+
+    h, s, v = hsv[..., 0], hsv[..., 1], hsv[..., 2]
+    masks = HUE_SAT_LUT[h, s] & VAL_LUT[v]
+    per_mask = np.bincount(masks.ravel(), minlength=len(_MASK_BITS))
+    counts = per_mask @ _MASK_BITS
+    pixels = dict(zip(FRUITS, counts.tolist()))
+
+    min_pixels = max(1, int(MIN_FRUIT_AREA * masks.size))
+    highest = None
+    for fruit in FRUITS:
+        if pixels[fruit] < min_pixels:
+            break  # the original scoring stops at the first missing fruit
+        highest = fruit
+    return SuikaResult(highest, pixels, decoded - started, time.perf_counter() - decoded)
@@ -1,4 +1,13 @@
-from .serverwrapped import ServerWrapped
+import logging
+import time
+
+log = logging.getLogger("red.wrapped")
 
 async def setup(bot):
+    # imported here so wrapped.analysis and wrapped.benchmarks (and the process pool's
+    # workers) can be imported without redbot and discord.py
+    started = time.perf_counter()
+    from .serverwrapped import ServerWrapped
+    import_seconds = time.perf_counter() - started
     await bot.add_cog(ServerWrapped(bot))
+    log.info("ServerWrapped loaded in %.0f ms (imports %.0f ms)", (time.perf_counter() - started) * 1000, import_seconds * 1000)
@@ -0,0 +1,509 @@
+import heapq
+import re
+import string
+from array import array
+from collections import Counter
+from datetime import datetime
+from functools import partial
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .index import IndexedMessage, fetch_by_id, iter_messages
+
+# NLTK and its data are loaded on first use, never at import, so loading the cog
+# does no network I/O and works on machines without internet access.
+# download name -> path inside the local NLTK data directory, as word_tokenize and
+# pos_tag_sents load them since NLTK 3.9
+NLTK_RESOURCES = {
+    "punkt_tab": "tokenizers/punkt_tab/english/",
+    "averaged_perceptron_tagger_eng": "taggers/averaged_perceptron_tagger_eng/",
+    "stopwords": "corpora/stopwords",
+}
+# the pickled models older NLTK versions load instead
+LEGACY_NLTK_RESOURCES = {
+    "punkt": "tokenizers/punkt",
+    "averaged_perceptron_tagger": "taggers/averaged_perceptron_tagger",
+    "stopwords": "corpora/stopwords",
+}
+_stopwords = None
+
+URL_RE = re.compile(r"https?://\S+|www\.\S+", re.IGNORECASE)
+MENTION_RE = re.compile(r"^(\s*<@!?\d+>\s*)+$")
+# One emoji as people see it: a flag (regional indicator pair), a keycap, or an emoji
+# character with optional variation selector, skin tone and tag sequence, joined by
+# ZWJs into family/profession sequences
+_EMOJI_CHAR = (
+    "[\U0001F000-\U0001FAFF\u2600-\u27BF\u2194-\u2199\u21A9\u21AA\u231A\u231B\u2328\u23CF"
+    "\u23E9-\u23F3\u23F8-\u23FA\u24C2\u25AA\u25AB\u25B6\u25C0\u25FB-\u25FE\u2934\u2935"
+    "\u2B05-\u2B07\u2B1B\u2B1C\u2B50\u2B55\u3030\u303D\u3297\u3299]"
+)
+_EMOJI_MODIFIERS = "\uFE0F?[\U0001F3FB-\U0001F3FF]?"
+EMOJI_SEQUENCE = (
+    "(?:[\U0001F1E6-\U0001F1FF]{2}"
+    "|[0-9#*]\uFE0F?\u20E3"
+    f"|{_EMOJI_CHAR}{_EMOJI_MODIFIERS}(?:[\U000E0020-\U000E007E]+\U000E007F)?"
+    f"(?:\u200D{_EMOJI_CHAR}{_EMOJI_MODIFIERS})*)"
+)
+# Every emoji in a message in a single scan: custom server emojis, :shortcodes: that
+# stand alone as a word, and unicode sequences
+EMOJI_RE = re.compile(
+    # the leading lookahead is one character set the regex engine can use to skip
+    # ordinary text before it tries any of the alternatives
+    f"(?=[<:0-9#*{_EMOJI_CHAR[1:-1]}])"
+    r"(?:(?P<custom><a?:\w+:\d+>)"
+    r"|(?P<colon>:(?<!\S:)[a-zA-Z0-9_~]+:(?!\S))"
+    f"|(?P<unicode>{EMOJI_SEQUENCE}))"
+)
+ONLY_ANY_EMOJI_RE = re.compile(
+    rf"^(?:\s*(?:{EMOJI_SEQUENCE}|<a?:\w+:\d+>|:[a-zA-Z0-9_~]+:)\s*)+$"
+)
+
+# Punctuation becomes whitespace; apostrophes and hyphens are kept so contractions and
+# hyphenated words come out the way Punkt's word_tokenize splits them
+_FAST_TABLE = str.maketrans({c: " " for c in string.punctuation.replace("'", "").replace("-", "") + "‘’“”«»…"})
+
+MIN_HIGHLIGHT_LEN = 10
+MAX_HIGHLIGHT_LEN = 350
+
+SCORE_WEIGHTS = {
+    "length": 2,
+    "attachment": 3,
+    "emoji": 1,
+    "rare_word": 1,
+    "question": 1,
+    "reactions": 1,
+    "mentions": -1,
+    "url": -1
+}
+REACTION_SCORE_CAP = 3
+HIGHLIGHT_COUNT = 5
+# Partial aggregates keep only what can still matter once merged: the best highlight
+# candidates by score before the rare-word bonus, and the most frequent words and n-grams
+HIGHLIGHT_CANDIDATES = 25
+# highlight candidates buffered before a vectorized pass prunes them to the best ones
+HIGHLIGHT_BLOCK = 4096
+PARTIAL_WORDS = 2000
+PARTIAL_GRAMS = 1000
+TOPIC_BATCH_SIZE = 2048
+TAG_CACHE_SIZE = 50_000
+
+
+class WrappedAccumulator:
+    """Incremental wrapped statistics, fed one message at a time.
+
+    Only counters, topic n-grams and a bounded block of highlight features are kept,
+    so memory doesn't grow with the number or size of messages.
+    """
+
+    __slots__ = (
+        "tokenize", "stopwords", "message_count", "first_message", "attachments", "reacted_messages",
+        "sidekicks", "emojis", "word_counts", "topics", "highlights",
+    )
+
+    def __init__(self, tokenizer: str = "nltk"):
+        self.tokenize = TOKENIZERS[tokenizer]
+        self.stopwords = english_stopwords()
+        self.message_count = 0
+        self.first_message = None
+        self.attachments = 0
+        self.reacted_messages = 0
+        self.sidekicks = Counter()
+        self.emojis = Counter()
+        self.word_counts = Counter()
+        self.topics = TopicCounter()
+        self.highlights = HighlightFeatures()
+
+    def add(self, m: IndexedMessage):
+        if self.first_message is None or m.created_at < self.first_message.created_at:
+            self.first_message = m
+        self.message_count += 1
+        self.attachments += m.attachment_count
+        if m.reaction_count:
+            self.reacted_messages += 1
+
+        # sidekicks, keyed by user id and resolved to names when rendering
+        if m.ref_author_id:
+            self.sidekicks[m.ref_author_id] += 1
+        for uid in m.mention_ids:
+            self.sidekicks[uid] += 1
+
+        # emojis; the highlight only counts the ones rendered inline, not bare :shortcodes:
+        inline_emojis = 0
+        for match in EMOJI_RE.finditer(m.content):
+            self.emojis[match.group()] += 1
+            if match.lastgroup != "colon":
+                inline_emojis += 1
+
+        # words for topics, tokenized once and reused for the highlight's rare-word check
+        tokens = [t for t in self.tokenize(m.content) if t not in self.stopwords]
+        self.topics.add(tokens)
+        self.word_counts.update(tokens)
+
+        if is_valid_highlight(m):
+            self.highlights.add(m, tokens, inline_emojis)
+
+    def partial(self, resolve: Callable[[List[int]], Dict[int, IndexedMessage]],
+                candidates: int = HIGHLIGHT_CANDIDATES) -> "PartialAggregate":
+        """These stats as a mergeable PartialAggregate, pruned to what a merge can still use."""
+        self.topics.flush()
+        best = self.highlights.best(candidates, self.highlights.base_scores())
+        records = resolve([self.highlights.ids[i] for i in best]) if best else {}
+        highlights = []
+        for (i, score), words in zip(best.items(), self.highlights.words(best)):
+            m = records.get(self.highlights.ids[i])
+            if m is not None:
+                highlights.append((score, m.id, m.channel_id, m.created_at, m.content, m.image_url, words))
+
+        partial = PartialAggregate()
+        partial.message_count = self.message_count
+        if self.first_message is not None:
+            partial.first_message = (self.first_message.created_at, self.first_message.content)
+        partial.attachments = self.attachments
+        partial.reacted_messages = self.reacted_messages
+        partial.sidekicks = self.sidekicks
+        partial.emojis = self.emojis
+        partial.word_counts = Counter(dict(self.word_counts.most_common(PARTIAL_WORDS)))
+        partial.grams = Counter(dict(self.topics.counts.most_common(PARTIAL_GRAMS)))
+        partial.highlights = highlights
+        return partial
+
+
+class PartialAggregate:
+    """Wrapped stats over one slice of time (a month, normally) that can be merged with others.
+
+    Counters and sums merge exactly. Word and n-gram counts are pruned to the most frequent
+    ones, and only the best HIGHLIGHT_CANDIDATES highlights are kept with their score before
+    the rare-word bonus, which is settled in finish() against the merged word counts.
+    Highlight tuples are (score, id, channel_id, created_at, content, image_url, words).
+    """
+
+    __slots__ = (
+        "message_count", "first_message", "attachments", "reacted_messages",
+        "sidekicks", "emojis", "word_counts", "grams", "highlights",
+    )
+
+    def __init__(self):
+        self.message_count = 0
+        self.first_message: Optional[Tuple[float, str]] = None
+        self.attachments = 0
+        self.reacted_messages = 0
+        self.sidekicks = Counter()
+        self.emojis = Counter()
+        self.word_counts = Counter()
+        self.grams = Counter()
+        self.highlights = []
+
+    def merge(self, other: "PartialAggregate") -> "PartialAggregate":
+        self.message_count += other.message_count
+        if other.first_message and (self.first_message is None or other.first_message < self.first_message):
+            self.first_message = other.first_message
+        self.attachments += other.attachments
+        self.reacted_messages += other.reacted_messages
+        self.sidekicks.update(other.sidekicks)
+        self.emojis.update(other.emojis)
+        self.word_counts.update(other.word_counts)
+        self.grams.update(other.grams)
+        self.highlights = heapq.nlargest(HIGHLIGHT_CANDIDATES, self.highlights + other.highlights, key=lambda h: h[0])
+        return self
+
+    def finish(self) -> dict:
+        """Final stats, as stored in the index and rendered by the embed."""
+        topics = [t for t, c in self.grams.most_common(20) if c >= 2]
+
+        common_words_set = {w for w, _ in self.word_counts.most_common(200)}
+        rare_bonus = SCORE_WEIGHTS["rare_word"]
+        scored = [(h[0] + rare_bonus * any(w not in common_words_set for w in h[6]), h) for h in self.highlights]
+        highlights = [
+            {"id": h[1], "channel_id": h[2], "created_at": h[3], "content": h[4], "image_url": h[5]}
+            for _, h in heapq.nlargest(HIGHLIGHT_COUNT, scored, key=lambda s: s[0])
+        ]
+
+        return {
+            "message_count": self.message_count,
+            "first_message": self.first_message[1] if self.first_message else "",
+            "topics": topics,
+            "sidekicks": self.sidekicks.most_common(),
+            "emojis": self.emojis.most_common(),
+            "attachments": self.attachments,
+            "reacted_messages": self.reacted_messages,
+            "highlight": highlights[0] if highlights else None,
+            "highlights": highlights,
+        }
+
+    def to_dict(self) -> dict:
+        # pairs rather than objects, since JSON object keys would turn user ids into strings
+        return {
+            "message_count": self.message_count,
+            "first_message": self.first_message,
+            "attachments": self.attachments,
+            "reacted_messages": self.reacted_messages,
+            "sidekicks": list(self.sidekicks.items()),
+            "emojis": list(self.emojis.items()),
+            "word_counts": list(self.word_counts.items()),
+            "grams": list(self.grams.items()),
+            "highlights": self.highlights,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "PartialAggregate":
+        partial = cls()
+        partial.message_count = data["message_count"]
+        partial.first_message = tuple(data["first_message"]) if data["first_message"] else None
+        partial.attachments = data["attachments"]
+        partial.reacted_messages = data["reacted_messages"]
+        partial.sidekicks = Counter(dict(data["sidekicks"]))
+        partial.emojis = Counter(dict(data["emojis"]))
+        partial.word_counts = Counter(dict(data["word_counts"]))
+        partial.grams = Counter(dict(data["grams"]))
+        partial.highlights = [tuple(h) for h in data["highlights"]]
+        return partial
+
+
+class HighlightFeatures:
+    """Highlight features of candidate messages, stored column-wise.
+
+    Features are extracted once per message into flat arrays and scored with one
+    weighted sum in NumPy. Every HIGHLIGHT_BLOCK candidates the block is scored
+    without the rare-word bonus and pruned to the best `keep`, the same cut
+    WrappedAccumulator.partial() makes, so the arrays stay bounded. The rare-word
+    bonus needs the final word counts, so each kept candidate's longer words are
+    stored as vocabulary ids.
+    """
+
+    __slots__ = (
+        "keep", "ids", "timestamps", "length", "image", "emoji", "question", "reactions", "url", "mentions",
+        "word_ids", "word_offsets", "vocab",
+    )
+
+    COLUMNS = ("ids", "timestamps", "length", "image", "emoji", "question", "reactions", "url", "mentions")
+
+    def __init__(self, keep: int = HIGHLIGHT_CANDIDATES):
+        self.keep = keep
+        self.ids = array("q")
+        self.timestamps = array("d")
+        self.length = array("b")
+        self.image = array("b")
+        self.emoji = array("h")
+        self.question = array("b")
+        self.reactions = array("l")
+        self.url = array("b")
+        self.mentions = array("b")
+        self.word_ids = array("l")
+        self.word_offsets = array("q")
+        self.vocab = {}
+
+    def __len__(self):
+        return len(self.ids)
+
+    def add(self, m: IndexedMessage, tokens: List[str], emoji_count: int):
+        content = m.content.strip()
+        self.ids.append(m.id)
+        self.timestamps.append(m.created_at)
+        self.length.append(MIN_HIGHLIGHT_LEN <= len(content) <= MAX_HIGHLIGHT_LEN)
+        self.image.append(bool(m.image_url))
+        self.emoji.append(min(emoji_count, 100))
+        self.question.append("?" in content)
+        self.reactions.append(m.reaction_count)
+        self.url.append(URL_RE.search(content) is not None)
+        self.mentions.append(bool(m.mention_ids))
+        self.word_offsets.append(len(self.word_ids))
+        vocab = self.vocab
+        for w in tokens:
+            if len(w) > 2:
+                self.word_ids.append(vocab.setdefault(w, len(vocab)))
+        if len(self.ids) >= HIGHLIGHT_BLOCK:
+            self.prune()
+
+    def prune(self):
+        """Keep only the `keep` best candidates by score before the rare-word bonus."""
+        positions = sorted(self.best(self.keep, self.base_scores()))
+        words = self.words(positions)
+        for name in self.COLUMNS:
+            column = getattr(self, name)
+            setattr(self, name, array(column.typecode, (column[i] for i in positions)))
+        self.word_ids = array("l")
+        self.word_offsets = array("q")
+        self.vocab = {}
+        for candidate_words in words:
+            self.word_offsets.append(len(self.word_ids))
+            for w in candidate_words:
+                self.word_ids.append(self.vocab.setdefault(w, len(self.vocab)))
+
+    def base_scores(self) -> "np.ndarray":
+        """Scores without the rare-word bonus, which depends on the final word counts."""
+        w = SCORE_WEIGHTS
+        emoji = np.asarray(self.emoji, dtype=np.int16)
+        return (
+            w["length"] * np.asarray(self.length, dtype=np.int8)
+            + w["attachment"] * np.asarray(self.image, dtype=np.int8)
+            + w["emoji"] * ((emoji >= 1) & (emoji <= 3))
+            + w["question"] * np.asarray(self.question, dtype=np.int8)
+            + np.minimum(np.asarray(self.reactions, dtype=np.int64) * w["reactions"], REACTION_SCORE_CAP)
+            + w["url"] * np.asarray(self.url, dtype=np.int8)
+            + w["mentions"] * np.asarray(self.mentions, dtype=np.int8)
+            # freshness tie-breaker
+            + np.asarray(self.timestamps, dtype=np.float64) / 1e9 * 1e-6
+        )
+
+    @staticmethod
+    def best(n: int, scores: "np.ndarray") -> Dict[int, float]:
+        """Positions of the `n` highest `scores`, best first, mapped to their score."""
+        if not len(scores):
+            return {}
+        best = np.argpartition(-scores, n - 1)[:n] if len(scores) > n else np.arange(len(scores))
+        best = best[np.argsort(-scores[best], kind="stable")]
+        return {int(i): float(scores[i]) for i in best}
+
+    def words(self, positions: Iterable[int]) -> List[List[str]]:
+        """The longer words of the candidates at `positions`, as fed to the rare-word check."""
+        vocab = list(self.vocab)  # ids were handed out in insertion order
+        offsets = self.word_offsets
+        words = []
+        for i in positions:
+            end = offsets[i + 1] if i + 1 < len(offsets) else len(self.word_ids)
+            words.append([vocab[j] for j in self.word_ids[offsets[i]:end]])
+        return words
+
+
+def analyze_partials(path: str, guild_id: int, author_id: int, channel_ids: Sequence[int],
+                     ranges: Sequence[Tuple[datetime, datetime]], tokenizer: str = "nltk") -> List[dict]:
+    """Process-pool entry point: one PartialAggregate dict per (start, end) range of one
+    author's records, read straight from the index at `path`."""
+    resolve = partial(fetch_by_id, path)
+    partials = []
+    for start, end in ranges:
+        acc = WrappedAccumulator(tokenizer)
+        for m in iter_messages(path, guild_id, author_id, channel_ids, start, end):
+            acc.add(m)
+        partials.append(acc.partial(resolve).to_dict())
+    return partials
+
+
+def nltk_resources() -> Dict[str, str]:
+    """The data packages the installed NLTK loads; PunktTokenizer arrived with punkt_tab in 3.9."""
+    import nltk.tokenize
+
+    return NLTK_RESOURCES if hasattr(nltk.tokenize, "PunktTokenizer") else LEGACY_NLTK_RESOURCES
+
+
+def missing_nltk_resources(tokenizer: str = "nltk") -> List[str]:
+    """NLTK data packages wrapped needs that aren't in the local data path. Never touches the network."""
+    import nltk
+
+    missing = []
+    for name, path in nltk_resources().items():
+        if name.startswith("punkt") and tokenizer != "nltk":
+            continue
+        try:
+            nltk.data.find(path)
+        except LookupError:
+            missing.append(name)
+    return missing
+
+
+def download_nltk_resources(names: Iterable[str]) -> List[str]:
+    """Download NLTK data packages; returns the ones that failed."""
+    import nltk
+
+    return [name for name in names if not nltk.download(name, quiet=True)]
+
+
+def english_stopwords() -> frozenset:
+    global _stopwords
+    if _stopwords is None:
+        from nltk.corpus import stopwords
+
+        _stopwords = frozenset(stopwords.words("english"))
+    return _stopwords
+
+
+def nltk_tokens(text: str) -> List[str]:
+    """Lowercased alphabetic words of `text` (URLs removed) via NLTK's Punkt-based word_tokenize."""
+    from nltk import word_tokenize
+
+    return [w.lower() for w in word_tokenize(URL_RE.sub("", text)) if w.isalpha()]
+
+
+def fast_tokens(text: str) -> List[str]:
+    """Same words as `nltk_tokens` using only str.translate/split, without Punkt."""
+    tokens = []
+    for w in URL_RE.sub("", text).translate(_FAST_TABLE).lower().split():
+        if "'" in w:
+            # word_tokenize splits "don't" into "do"/"n't" and "i'm" into "i"/"'m"
+            w = w[:-3] if w.endswith("n't") else w.split("'", 1)[0]
+        if w.isalpha():
+            tokens.append(w)
+    return tokens
+
+
+TOKENIZERS = {"nltk": nltk_tokens, "fast": fast_tokens}
+
+
+class TopicCounter:
+    """Noun/adjective bigram and trigram counts, POS-tagged in batches.
+
+    Messages are buffered and tagged TOPIC_BATCH_SIZE at a time with one
+    pos_tag_sents call; tags are cached per distinct token sequence, since
+    short messages repeat a lot.
+    """
+
+    __slots__ = ("counts", "_pending", "_nouns_adj")
+
+    def __init__(self):
+        self.counts = Counter()
+        self._pending = []
+        self._nouns_adj = {}  # token tuple -> its nouns/adjectives
+
+    def add(self, words: List[str]):
+        if len(words) >= 2:
+            self._pending.append(tuple(words))
+            if len(self._pending) >= TOPIC_BATCH_SIZE:
+                self.flush()
+
+    def flush(self):
+        if not self._pending:
+            return
+        if len(self._nouns_adj) > TAG_CACHE_SIZE:
+            self._nouns_adj.clear()
+        from nltk.tag import pos_tag_sents
+
+        # POS tagging for nouns/adjectives
+        untagged = list({seq for seq in self._pending if seq not in self._nouns_adj})
+        for seq, pos in zip(untagged, pos_tag_sents(untagged)):
+            self._nouns_adj[seq] = tuple(w for w, p in pos if p.startswith("NN") or p.startswith("JJ"))
+
+        # bigrams and trigrams from one flat buffer, with None marking message boundaries
+        flat = []
+        for seq in self._pending:
+            nouns_adj = self._nouns_adj[seq]
+            if len(nouns_adj) >= 2:
+                flat.extend(nouns_adj)
+                flat.append(None)
+        self._pending = []
+        counts = self.counts
+        for a, b, c in zip(flat, flat[1:], flat[2:] + [None]):
+            if b is None:
+                continue
+            if a is not None:
+                counts[a + " " + b] += 1
+            if c is not None and a is not None:
+                counts[a + " " + b + " " + c] += 1
+
+
+def is_valid_highlight(m: IndexedMessage) -> bool:
+    if not m.content and not m.attachment_count:
+        return False
+    content = m.content.strip()
+    if content and (len(content) < MIN_HIGHLIGHT_LEN or len(content) > MAX_HIGHLIGHT_LEN):
+        if not m.attachment_count:
+            return False
+    if content and URL_RE.sub("", content).strip() == "":
+        return False
+    if MENTION_RE.match(content):
+        return False
+    if ONLY_ANY_EMOJI_RE.match(content):
+        return False
+    if content.startswith(("!", ".", "-", "~", "/")):
+        return False
+    return True
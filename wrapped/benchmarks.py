@@ -0,0 +1,254 @@
+"""Offline benchmarks for the wrapped analysis hot path.
+
+Run from the repo root with ``python -m wrapped.benchmarks``, e.g.
+``python -m wrapped.benchmarks -n 1000 10000 100000 1000000 --only pipeline``.
+"""
+import argparse
+import random
+import re
+import time
+import tracemalloc
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+from .analysis import (
+    EMOJI_RE, TOKENIZERS, HighlightFeatures, PartialAggregate, TopicCounter, WrappedAccumulator,
+    english_stopwords, fast_tokens, is_valid_highlight,
+)
+from .index import IndexedMessage
+
+WORDS = (
+    "the game last night was actually insane and i can't believe we won it "
+    "anyone up for pizza later? honestly that movie's ending was well-known "
+    "python bot server music playlist weekend raid boss cat dog meme vibes"
+).split()
+URLS = ("https://example.com/some/page?x=1", "www.youtube.com/watch?v=dQw4w9WgXcQ")
+EMOJIS = (
+    "😀", "😂😂", "👍🏽", "👨‍👩‍👧", "🇫🇷", "❤️", "☀️", "1️⃣", "👩🏾‍💻",
+    "<:pog:123456789012345678>", "<a:dance:123456789012345678>", ":smile:",
+)
+ATTACHMENTS = (
+    ("image/png", "screenshot.png"),
+    ("image/gif", "reaction.gif"),
+    (None, "photo.JPG"),
+    ("application/pdf", "notes.pdf"),
+    ("video/mp4", "clip.mp4"),
+)
+
+# The three-pass extraction wrapped used before EMOJI_RE, kept for comparison
+LEGACY_CUSTOM_EMOJI_RE = re.compile(r"<a?:\w+:\d+>")
+LEGACY_UNICODE_EMOJI_RE = re.compile(
+    "["
+    "\U0001F600-\U0001F64F"
+    "\U0001F300-\U0001F5FF"
+    "\U0001F680-\U0001F6FF"
+    "\U0001F1E0-\U0001F1FF"
+    "]+", flags=re.UNICODE
+)
+LEGACY_COLON_EMOJI_RE = re.compile(r"^:[a-zA-Z0-9_~]+:$")
+
+
+def synthetic_texts(n: int, seed: int = 0):
+    rng = random.Random(seed)
+    texts = []
+    for _ in range(n):
+        words = rng.choices(WORDS, k=rng.randint(1, 30))
+        if rng.random() < 0.1:
+            words.append(rng.choice(URLS))
+        if rng.random() < 0.25:
+            words.insert(rng.randrange(len(words) + 1), rng.choice(EMOJIS))
+        text = " ".join(words)
+        if rng.random() < 0.3:
+            text = text.capitalize() + rng.choice((".", "!", "?", "..."))
+        texts.append(text)
+    return texts
+
+
+def fake_messages(n: int, seed: int = 0, authors: int = 50):
+    """`n` stand-ins for discord.Message with everything IndexedMessage.from_message reads."""
+    rng = random.Random(seed)
+    guild = SimpleNamespace(id=1)
+    channels = [SimpleNamespace(id=100 + i) for i in range(8)]
+    users = [SimpleNamespace(id=1000 + i) for i in range(authors)]
+    texts = synthetic_texts(n, seed)
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    step = timedelta(days=365) / max(n, 1)
+    messages = []
+    for i, content in enumerate(texts):
+        author = users[i % authors]
+        mentions = rng.sample(users, rng.randint(1, 2)) if rng.random() < 0.1 else []
+        if mentions and rng.random() < 0.5:
+            content = " ".join(f"<@{u.id}>" for u in mentions) + " " + content
+        attachments = []
+        if rng.random() < 0.08:
+            content_type, filename = rng.choice(ATTACHMENTS)
+            attachments.append(SimpleNamespace(
+                content_type=content_type, filename=filename,
+                url=f"https://cdn.discordapp.com/attachments/{i}/{filename}",
+            ))
+        reactions = []
+        if rng.random() < 0.2:
+            reactions = [SimpleNamespace(count=rng.randint(1, 8)) for _ in range(rng.randint(1, 3))]
+        reference = None
+        if rng.random() < 0.15:
+            reference = SimpleNamespace(resolved=SimpleNamespace(author=rng.choice(users)))
+        messages.append(SimpleNamespace(
+            id=10**15 + i,
+            guild=guild,
+            channel=channels[i % len(channels)],
+            author=author,
+            created_at=start + step * i,
+            content=content,
+            reactions=reactions,
+            attachments=attachments,
+            reference=reference,
+            mentions=mentions,
+        ))
+    return messages
+
+
+def run_stage(name: str, n: int, fn, *args, memory: bool = True):
+    """Run one stage on `args`, print its throughput and peak traced memory, and return its result."""
+    if memory:
+        tracemalloc.start()
+    started = time.perf_counter()
+    result = fn(*args)
+    elapsed = time.perf_counter() - started
+    peak = ""
+    if memory:
+        peak = f", peak {tracemalloc.get_traced_memory()[1] / 2**20:,.1f} MiB"
+        tracemalloc.stop()
+    print(f"  {name:<10} {n / elapsed:>12,.0f} msgs/sec ({elapsed:.3f}s{peak})")
+    return result
+
+
+def index_stage(fakes):
+    return [IndexedMessage.from_message(m) for m in fakes]
+
+
+def tokenize_stage(records, tokenizer: str):
+    tokenize = TOKENIZERS[tokenizer]
+    stopwords = english_stopwords()
+    return [[t for t in tokenize(m.content) if t not in stopwords] for m in records]
+
+
+def topics_stage(tokens):
+    counter = TopicCounter()
+    for words in tokens:
+        counter.add(words)
+    counter.flush()
+    return counter.counts
+
+
+def highlight_stage(records, tokens):
+    features = HighlightFeatures()
+    for m, words in zip(records, tokens):
+        if is_valid_highlight(m):
+            features.add(m, words, sum(1 for _ in EMOJI_RE.finditer(m.content)))
+    return features.best(features.keep, features.base_scores())
+
+
+def wrapped_stage(records, tokenizer: str):
+    """What [p]wrapped runs: a partial per month, round-tripped as stored, then merged and finished."""
+    by_id = {m.id: m for m in records}
+    months = defaultdict(list)
+    for m in records:
+        created = datetime.fromtimestamp(m.created_at, timezone.utc)
+        months[created.year * 100 + created.month].append(m)
+    total = PartialAggregate()
+    for month in sorted(months):
+        acc = WrappedAccumulator(tokenizer)
+        for m in months[month]:
+            acc.add(m)
+        partial = acc.partial(lambda ids: {i: by_id[i] for i in ids}).to_dict()
+        total.merge(PartialAggregate.from_dict(partial))
+    return total.finish()
+
+
+def bench_pipeline(n: int, tokenizer: str = "fast", memory: bool = True):
+    """Each stage of a wrapped run over `n` fake messages, then the whole run end to end.
+
+    Each stage's inputs are dropped as soon as no later stage needs them, so peak
+    memory reflects that stage alone.
+    """
+    print(f"pipeline, {n:,} messages, {tokenizer} tokenizer" + (" (timings include tracemalloc)" if memory else ""))
+    fakes = run_stage("generate", n, fake_messages, n, memory=memory)
+    records = run_stage("index", n, index_stage, fakes, memory=memory)
+    del fakes
+    tokens = run_stage("tokenize", n, tokenize_stage, records, tokenizer, memory=memory)
+    run_stage("topics", n, topics_stage, tokens, memory=memory)
+    run_stage("highlight", n, highlight_stage, records, tokens, memory=memory)
+    del tokens
+    run_stage("wrapped", n, wrapped_stage, records, tokenizer, memory=memory)
+
+
+def bench_tokenizers(n: int):
+    texts = synthetic_texts(n)
+    results = {}
+    for name, tokenize in TOKENIZERS.items():
+        started = time.perf_counter()
+        results[name] = [tokenize(t) for t in texts]
+        elapsed = time.perf_counter() - started
+        print(f"tokenizer {name:>5}: {n / elapsed:>12,.0f} msgs/sec ({elapsed:.3f}s)")
+    same = sum(a == b for a, b in zip(results["nltk"], results["fast"]))
+    print(f"identical token lists: {same}/{n} ({same / n:.1%})")
+
+
+def legacy_emojis(text: str, counter: Counter):
+    for match in LEGACY_CUSTOM_EMOJI_RE.findall(text):
+        counter[match] += 1
+    for match in LEGACY_UNICODE_EMOJI_RE.findall(text):
+        counter[match] += 1
+    for token in text.split():
+        if LEGACY_COLON_EMOJI_RE.match(token):
+            counter[token] += 1
+
+
+def single_pass_emojis(text: str, counter: Counter):
+    for match in EMOJI_RE.finditer(text):
+        counter[match.group()] += 1
+
+
+def bench_emojis(n: int):
+    texts = synthetic_texts(n)
+    for name, extract in (("three-pass", legacy_emojis), ("single-pass", single_pass_emojis)):
+        counter = Counter()
+        started = time.perf_counter()
+        for t in texts:
+            extract(t, counter)
+        elapsed = time.perf_counter() - started
+        print(f"emojis {name:>11}: {n / elapsed:>12,.0f} msgs/sec ({elapsed:.3f}s), {len(counter)} distinct")
+
+
+def bench_topics(n: int):
+    word_lists = [fast_tokens(t) for t in synthetic_texts(n)]
+    started = time.perf_counter()
+    topics_stage(word_lists)
+    elapsed = time.perf_counter() - started
+    print(f"topics: {n / elapsed:>12,.0f} msgs/sec ({elapsed:.3f}s)")
+
+
+BENCHMARKS = ("tokenizers", "topics", "emojis", "pipeline")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-n", type=int, nargs="+", default=[10_000], help="messages per run, one run per size")
+    parser.add_argument("--only", choices=BENCHMARKS, nargs="+", default=BENCHMARKS, help="benchmarks to run")
+    parser.add_argument("--tokenizer", choices=TOKENIZERS, default="fast", help="tokenizer for the pipeline run")
+    parser.add_argument("--no-memory", action="store_true", help="skip tracemalloc for cleaner timings")
+    args = parser.parse_args(argv)
+    for n in args.n:
+        if "tokenizers" in args.only:
+            bench_tokenizers(n)
+        if "topics" in args.only:
+            bench_topics(n)
+        if "emojis" in args.only:
+            bench_emojis(n)
+        if "pipeline" in args.only:
+            bench_pipeline(n, args.tokenizer, memory=not args.no_memory)
+
+
+if __name__ == "__main__":
+    main()
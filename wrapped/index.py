@@ -0,0 +1,428 @@
+import asyncio
+import json
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Sequence
+
+IMAGE_EXTENSIONS = (".gif", ".png", ".jpg", ".jpeg", ".webp")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS messages (
+    message_id INTEGER PRIMARY KEY,
+    guild_id INTEGER NOT NULL,
+    channel_id INTEGER NOT NULL,
+    author_id INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    content TEXT NOT NULL,
+    reaction_count INTEGER NOT NULL DEFAULT 0,
+    attachment_count INTEGER NOT NULL DEFAULT 0,
+    image_url TEXT,
+    ref_author_id INTEGER,
+    mention_ids TEXT NOT NULL DEFAULT ''
+);
+CREATE INDEX IF NOT EXISTS messages_by_author ON messages (guild_id, author_id, created_at);
+CREATE TABLE IF NOT EXISTS channels (
+    channel_id INTEGER PRIMARY KEY,
+    guild_id INTEGER NOT NULL,
+    oldest REAL NOT NULL,
+    last_message_id INTEGER,
+    fill_from REAL,
+    fill_cursor INTEGER
+);
+CREATE TABLE IF NOT EXISTS stats (
+    guild_id INTEGER NOT NULL,
+    author_id INTEGER NOT NULL,
+    year INTEGER NOT NULL,
+    channel_key TEXT NOT NULL,
+    message_count INTEGER NOT NULL,
+    computed_at REAL NOT NULL,
+    accessed_at REAL NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (guild_id, author_id, year, channel_key)
+);
+CREATE TABLE IF NOT EXISTS partials (
+    guild_id INTEGER NOT NULL,
+    author_id INTEGER NOT NULL,
+    month INTEGER NOT NULL,
+    channel_key TEXT NOT NULL,
+    accessed_at REAL NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (guild_id, author_id, channel_key, month)
+);
+CREATE INDEX IF NOT EXISTS stats_by_access ON stats (accessed_at);
+CREATE INDEX IF NOT EXISTS partials_by_access ON partials (accessed_at);
+"""
+
+MESSAGE_COLUMNS = (
+    "message_id, guild_id, channel_id, author_id, created_at, content, "
+    "reaction_count, attachment_count, image_url, ref_author_id, mention_ids"
+)
+
+
+class IndexedMessage:
+    """Compact copy of the parts of a discord.Message that wrapped needs."""
+
+    __slots__ = (
+        "id", "guild_id", "channel_id", "author_id", "created_at", "content",
+        "reaction_count", "attachment_count", "image_url", "ref_author_id", "mention_ids",
+    )
+
+    def __init__(self, id, guild_id, channel_id, author_id, created_at, content,
+                 reaction_count=0, attachment_count=0, image_url=None, ref_author_id=None, mention_ids=()):
+        self.id = id
+        self.guild_id = guild_id
+        self.channel_id = channel_id
+        self.author_id = author_id
+        self.created_at = created_at  # unix timestamp, seconds
+        self.content = content
+        self.reaction_count = reaction_count
+        self.attachment_count = attachment_count
+        self.image_url = image_url
+        self.ref_author_id = ref_author_id
+        self.mention_ids = mention_ids
+
+    @classmethod
+    def from_message(cls, m) -> "IndexedMessage":
+        image_url = None
+        for a in m.attachments:
+            if (a.content_type and a.content_type.startswith("image")) or a.filename.lower().endswith(IMAGE_EXTENSIONS):
+                image_url = a.url
+                break
+
+        ref_author_id = None
+        if m.reference and m.reference.resolved is not None:
+            ref_author = getattr(m.reference.resolved, "author", None)
+            if ref_author is not None:
+                ref_author_id = ref_author.id
+
+        return cls(
+            id=m.id,
+            guild_id=m.guild.id,
+            channel_id=m.channel.id,
+            author_id=m.author.id,
+            created_at=m.created_at.timestamp(),
+            content=m.content or "",
+            reaction_count=sum(r.count for r in m.reactions),
+            attachment_count=len(m.attachments),
+            image_url=image_url,
+            ref_author_id=ref_author_id,
+            mention_ids=tuple(u.id for u in m.mentions if u.id != m.author.id),
+        )
+
+    @classmethod
+    def from_row(cls, row: Sequence) -> "IndexedMessage":
+        mention_ids = tuple(int(u) for u in row[10].split()) if row[10] else ()
+        return cls(*row[:10], mention_ids=mention_ids)
+
+    def to_row(self) -> tuple:
+        return (
+            self.id, self.guild_id, self.channel_id, self.author_id, self.created_at, self.content,
+            self.reaction_count, self.attachment_count, self.image_url, self.ref_author_id,
+            " ".join(str(u) for u in self.mention_ids),
+        )
+
+    @property
+    def created(self) -> datetime:
+        return datetime.fromtimestamp(self.created_at, tz=timezone.utc)
+
+
+class ChannelState(NamedTuple):
+    """Index coverage for one channel: every message from ``oldest`` up to ``last_message_id``.
+
+    While older history is being filled in, ``fill_from`` is the target start and ``fill_cursor``
+    the last message id reached, so an interrupted fill can resume.
+    """
+    oldest: float
+    last_message_id: Optional[int]
+    fill_from: Optional[float]
+    fill_cursor: Optional[int]
+
+
+def _author_query(guild_id: int, author_id: int, channel_ids: Sequence[int], start: float, end: float):
+    marks = ",".join("?" * len(channel_ids))
+    return (
+        f"SELECT {MESSAGE_COLUMNS} FROM messages "
+        f"WHERE guild_id = ? AND author_id = ? AND created_at >= ? AND created_at < ? AND channel_id IN ({marks}) "
+        "ORDER BY created_at",
+        (guild_id, author_id, start, end, *channel_ids),
+    )
+
+
+def iter_messages(path: str, guild_id: int, author_id: int, channel_ids: Sequence[int],
+                  start: datetime, end: datetime, chunk_size: int = 1000) -> Iterator[IndexedMessage]:
+    """Stream one author's records oldest first over a separate read-only connection.
+
+    WAL mode lets this run alongside writes from the cog, so long analyses never hold the index lock.
+    """
+    if not channel_ids:
+        return
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        cursor = conn.execute(*_author_query(guild_id, author_id, channel_ids, start.timestamp(), end.timestamp()))
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            for row in rows:
+                yield IndexedMessage.from_row(row)
+    finally:
+        conn.close()
+
+
+def fetch_by_id(path: str, message_ids: Sequence[int]) -> Dict[int, IndexedMessage]:
+    """Look records up by message id over a separate read-only connection."""
+    if not message_ids:
+        return {}
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        marks = ",".join("?" * len(message_ids))
+        rows = conn.execute(f"SELECT {MESSAGE_COLUMNS} FROM messages WHERE message_id IN ({marks})", tuple(message_ids))
+        return {row[0]: IndexedMessage.from_row(row) for row in rows}
+    finally:
+        conn.close()
+
+
+class MessageIndex:
+    """SQLite store of per-message records, keyed by guild/channel/author/timestamp.
+
+    All queries run in a worker thread so the event loop never waits on disk.
+    """
+
+    def __init__(self, path):
+        self.path = str(path)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+        self._lock = threading.Lock()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    async def _run(self, fn, *args):
+        def locked():
+            with self._lock:
+                return fn(*args)
+        return await asyncio.to_thread(locked)
+
+    # -------------------
+    # Messages
+    # -------------------
+    def _add(self, records: List[IndexedMessage]):
+        with self._conn:
+            self._conn.executemany(
+                f"INSERT OR REPLACE INTO messages ({MESSAGE_COLUMNS}) VALUES (?,?,?,?,?,?,?,?,?,?,?)",
+                [r.to_row() for r in records],
+            )
+
+    async def add(self, records: Iterable[IndexedMessage]):
+        records = list(records)
+        if records:
+            await self._run(self._add, records)
+
+    def _scalar(self, sql: str, params: tuple):
+        row = self._conn.execute(sql, params).fetchone()
+        return row[0] if row else None
+
+    async def count(self, guild_id: int, author_id: int, channel_ids: Sequence[int], start: datetime, end: datetime) -> int:
+        if not channel_ids:
+            return 0
+        marks = ",".join("?" * len(channel_ids))
+        return await self._run(
+            self._scalar,
+            "SELECT COUNT(*) FROM messages WHERE guild_id = ? AND author_id = ? AND created_at >= ? AND created_at < ? "
+            f"AND channel_id IN ({marks})",
+            (guild_id, author_id, start.timestamp(), end.timestamp(), *channel_ids),
+        )
+
+    def _authors(self, guild_id: int, channel_ids: Sequence[int], start: float, end: float) -> List[int]:
+        marks = ",".join("?" * len(channel_ids))
+        rows = self._conn.execute(
+            "SELECT DISTINCT author_id FROM messages WHERE guild_id = ? AND created_at >= ? AND created_at < ? "
+            f"AND channel_id IN ({marks})",
+            (guild_id, start, end, *channel_ids),
+        ).fetchall()
+        return [row[0] for row in rows]
+
+    async def authors(self, guild_id: int, channel_ids: Sequence[int], start: datetime, end: datetime) -> List[int]:
+        if not channel_ids:
+            return []
+        return await self._run(self._authors, guild_id, list(channel_ids), start.timestamp(), end.timestamp())
+
+    def _update(self, sql: str, params: tuple):
+        with self._conn:
+            self._conn.execute(sql, params)
+
+    async def add_reactions(self, message_id: int, delta: int):
+        await self._run(
+            self._update,
+            "UPDATE messages SET reaction_count = MAX(reaction_count + ?, 0) WHERE message_id = ?",
+            (delta, message_id),
+        )
+
+    async def edit(self, message_id: int, content: str):
+        await self._run(self._update, "UPDATE messages SET content = ? WHERE message_id = ?", (content, message_id))
+
+    async def delete(self, message_id: int):
+        await self._run(self._update, "DELETE FROM messages WHERE message_id = ?", (message_id,))
+
+    # -------------------
+    # Channel coverage
+    # -------------------
+    def _channel_state(self, channel_id: int) -> Optional[ChannelState]:
+        row = self._conn.execute(
+            "SELECT oldest, last_message_id, fill_from, fill_cursor FROM channels WHERE channel_id = ?", (channel_id,)
+        ).fetchone()
+        return ChannelState(*row) if row else None
+
+    async def channel_state(self, channel_id: int) -> Optional[ChannelState]:
+        return await self._run(self._channel_state, channel_id)
+
+    async def set_channel_state(self, guild_id: int, channel_id: int, oldest: float, last_message_id: Optional[int] = None):
+        await self._run(
+            self._update,
+            "INSERT OR REPLACE INTO channels (channel_id, guild_id, oldest, last_message_id) VALUES (?,?,?,?)",
+            (channel_id, guild_id, oldest, last_message_id),
+        )
+
+    async def advance(self, channel_id: int, message_id: int):
+        await self._run(
+            self._update,
+            "UPDATE channels SET last_message_id = MAX(COALESCE(last_message_id, 0), ?) WHERE channel_id = ?",
+            (message_id, channel_id),
+        )
+
+    async def start_fill(self, channel_id: int, fill_from: float):
+        await self._run(
+            self._update,
+            "UPDATE channels SET fill_from = ?, fill_cursor = NULL WHERE channel_id = ?",
+            (fill_from, channel_id),
+        )
+
+    async def fill_checkpoint(self, channel_id: int, message_id: int):
+        await self._run(self._update, "UPDATE channels SET fill_cursor = ? WHERE channel_id = ?", (message_id, channel_id))
+
+    async def finish_fill(self, channel_id: int):
+        await self._run(
+            self._update,
+            "UPDATE channels SET oldest = MIN(oldest, fill_from), fill_from = NULL, fill_cursor = NULL "
+            "WHERE channel_id = ? AND fill_from IS NOT NULL",
+            (channel_id,),
+        )
+
+    # -------------------
+    # Computed stats
+    # -------------------
+    def _get_stats(self, guild_id: int, author_id: int, year: int, channel_key: str, message_count: Optional[int],
+                   max_delta: int, max_age: Optional[float], computed_since: Optional[float]) -> Optional[dict]:
+        row = self._conn.execute(
+            "SELECT message_count, computed_at, data FROM stats "
+            "WHERE guild_id = ? AND author_id = ? AND year = ? AND channel_key = ?",
+            (guild_id, author_id, year, channel_key),
+        ).fetchone()
+        if row is None:
+            return None
+        cached_count, computed_at, data = row
+        if computed_since is not None and computed_at < computed_since:
+            return None
+        if message_count is not None and abs(message_count - cached_count) > max_delta:
+            return None
+        if max_age is not None and time.time() - computed_at > max_age:
+            return None
+        with self._conn:
+            self._conn.execute(
+                "UPDATE stats SET accessed_at = ? WHERE guild_id = ? AND author_id = ? AND year = ? AND channel_key = ?",
+                (time.time(), guild_id, author_id, year, channel_key),
+            )
+        return json.loads(data)
+
+    async def get_stats(self, guild_id: int, author_id: int, year: int, channel_key: str,
+                        message_count: Optional[int] = None, max_delta: int = 0,
+                        max_age: Optional[float] = None, computed_since: Optional[float] = None) -> Optional[dict]:
+        """Cached stats for this member/year/channel set.
+
+        With ``message_count`` the entry is only returned if it was computed over a count within
+        ``max_delta`` of it; with ``max_age`` only if it's at most that many seconds old; with
+        ``computed_since`` only if it was computed at or after that POSIX time.
+        """
+        return await self._run(
+            self._get_stats, guild_id, author_id, year, channel_key, message_count, max_delta, max_age, computed_since
+        )
+
+    def _put_stats(self, guild_id: int, author_id: int, year: int, channel_key: str, stats: dict, max_entries: int):
+        now = time.time()
+        with self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO stats "
+                "(guild_id, author_id, year, channel_key, message_count, computed_at, accessed_at, data) "
+                "VALUES (?,?,?,?,?,?,?,?)",
+                (guild_id, author_id, year, channel_key, stats["message_count"], now, now, json.dumps(stats)),
+            )
+            self._evict("stats", max_entries)
+
+    def _evict(self, table: str, max_entries: int):
+        """Drop the least recently used rows of a cache table once it holds more than `max_entries`.
+
+        Only the rows over the cap are read, oldest first through the accessed_at index.
+        """
+        (count,) = self._conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()
+        if count > max_entries:
+            self._conn.execute(
+                f"DELETE FROM {table} WHERE rowid IN (SELECT rowid FROM {table} ORDER BY accessed_at LIMIT ?)",
+                (count - max_entries,),
+            )
+
+    async def put_stats(self, guild_id: int, author_id: int, year: int, channel_key: str, stats: dict,
+                        max_entries: int = 10_000):
+        await self._run(self._put_stats, guild_id, author_id, year, channel_key, stats, max_entries)
+
+    def _clear_stats(self, guild_id: int):
+        with self._conn:
+            self._conn.execute("DELETE FROM stats WHERE guild_id = ?", (guild_id,))
+            self._conn.execute("DELETE FROM partials WHERE guild_id = ?", (guild_id,))
+
+    async def clear_stats(self, guild_id: int):
+        """Drop every cached result for a guild, monthly partials included."""
+        await self._run(self._clear_stats, guild_id)
+
+    # -------------------
+    # Monthly partial aggregates
+    # -------------------
+    def _get_partials(self, guild_id: int, author_id: int, channel_key: str, months: List[int]) -> Dict[int, dict]:
+        if not months:
+            return {}
+        marks = ",".join("?" * len(months))
+        params = (guild_id, author_id, channel_key, *months)
+        rows = self._conn.execute(
+            f"SELECT month, data FROM partials WHERE guild_id = ? AND author_id = ? AND channel_key = ? AND month IN ({marks})",
+            params,
+        ).fetchall()
+        if rows:
+            with self._conn:
+                self._conn.execute(
+                    f"UPDATE partials SET accessed_at = ? "
+                    f"WHERE guild_id = ? AND author_id = ? AND channel_key = ? AND month IN ({marks})",
+                    (time.time(), *params),
+                )
+        return {month: json.loads(data) for month, data in rows}
+
+    async def get_partials(self, guild_id: int, author_id: int, channel_key: str, months: Sequence[int]) -> Dict[int, dict]:
+        """Stored partial aggregates for the given months (as ``year * 100 + month``), keyed by month."""
+        return await self._run(self._get_partials, guild_id, author_id, channel_key, list(months))
+
+    def _put_partials(self, guild_id: int, author_id: int, channel_key: str, partials: Dict[int, dict], max_entries: int):
+        now = time.time()
+        with self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO partials (guild_id, author_id, month, channel_key, accessed_at, data) "
+                "VALUES (?,?,?,?,?,?)",
+                [(guild_id, author_id, month, channel_key, now, json.dumps(data)) for month, data in partials.items()],
+            )
+            self._evict("partials", max_entries)
+
+    async def put_partials(self, guild_id: int, author_id: int, channel_key: str, partials: Dict[int, dict],
+                           max_entries: int = 100_000):
+        if partials:
+            await self._run(self._put_partials, guild_id, author_id, channel_key, partials, max_entries)
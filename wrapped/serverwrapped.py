@@ -1,56 +1,36 @@
-import re
 import asyncio
-from collections import Counter
-from datetime import datetime, timezone
+import functools
+from concurrent.futures import ProcessPoolExecutor
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
 from typing import List, Optional, Tuple
 
 import discord
 from redbot.core import commands, Config
+from redbot.core.data_manager import cog_data_path
 
-import nltk
-from nltk import word_tokenize, pos_tag
-from nltk.corpus import stopwords
-from nltk.util import ngrams
-
-# Ensure NLTK data is downloaded
-nltk.download('punkt')
-nltk.download('averaged_perceptron_tagger')
-nltk.download('stopwords')
-
-STOPWORDS = set(stopwords.words('english'))
-
-URL_RE = re.compile(r"https?://\S+|www\.\S+", re.IGNORECASE)
-MENTION_RE = re.compile(r"^(\s*<@!?\d+>\s*)+$")
-ONLY_ANY_EMOJI_RE = re.compile(
-    r"^(?:\s*(?:[\U0001F300-\U0001FAFF\u2600-\u27BF]|<a?:\w+:\d+>|:[a-zA-Z0-9_~]+:)\s*)+$"
-)
-CUSTOM_EMOJI_RE = re.compile(r"<a?:\w+:\d+>")
-UNICODE_EMOJI_RE = re.compile(
-    "[" 
-    "\U0001F600-\U0001F64F"
-    "\U0001F300-\U0001F5FF"
-    "\U0001F680-\U0001F6FF"
-    "\U0001F1E0-\U0001F1FF"
-    "]+", flags=re.UNICODE
+from .analysis import (
+    TOKENIZERS, PartialAggregate, analyze_partials, download_nltk_resources, missing_nltk_resources,
 )
-COLON_EMOJI_RE = re.compile(r"^:[a-zA-Z0-9_~]+:$")
-
-MIN_HIGHLIGHT_LEN = 10
-MAX_HIGHLIGHT_LEN = 350
-
-SCORE_WEIGHTS = {
-    "length": 2,
-    "attachment": 3,
-    "emoji": 1,
-    "rare_word": 1,
-    "question": 1,
-    "reactions": 1,
-    "mentions": -1,
-    "url": -1
-}
-REACTION_SCORE_CAP = 3
-
-DEFAULTS = {"channels": []}
+from .index import IndexedMessage, MessageIndex
+
+INDEX_BATCH_SIZE = 500
+SCAN_RETRIES = 5
+SCAN_BACKOFF = 1  # seconds, doubled per retry
+ANALYSIS_WORKERS = 2
+# Cached stats are reused while the member has posted at most this many messages since
+# and the entry is younger than the TTL; ones computed after their year ended never change.
+STATS_MAX_DELTA = 10
+STATS_TTL = 6 * 60 * 60
+STATS_MAX_ENTRIES = 10_000
+# Stats are built from per-member monthly partial aggregates; finished months are stored
+# so only the current (or a partially covered) month is ever recomputed
+PARTIALS_MAX_ENTRIES = 100_000
+RECENT_DAYS = 90
+MAX_RECENT_DAYS = 3 * 366
+
+DEFAULTS = {"channels": [], "scan_concurrency": 4, "tokenizer": "nltk"}
+MAX_SCAN_CONCURRENCY = 10
 
 class ServerWrapped(commands.Cog):
     """Server Wrapped summary"""
@@ -59,6 +39,20 @@ class ServerWrapped(commands.Cog):
         self.bot = bot
         self.config = Config.get_conf(self, identifier=1234567890)
         self.config.register_guild(**DEFAULTS)
+        self.index = MessageIndex(cog_data_path(self) / "index.sqlite3")
+        # channels whose index is known to be gapless up to now during this gateway session
+        self._live_channels = set()
+        self._channel_locks = defaultdict(asyncio.Lock)
+        # NLTK analysis is CPU-bound, so it runs in worker processes rather than on the event loop
+        self._pool = None
+        self._analysis_slots = asyncio.Semaphore(ANALYSIS_WORKERS)
+        self._analysis_queue = 0
+        self._nltk_checked = set()  # tokenizer modes whose NLTK data was found locally
+
+    def cog_unload(self):
+        if self._pool:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+        self.index.close()
 
     # -------------------
     # Setup command
@@ -74,6 +68,31 @@ class ServerWrapped(commands.Cog):
         await self.config.guild(ctx.guild).channels.set(channel_ids)
         await ctx.send(f"Wrapped will scan {len(channel_ids)} channels.")
 
+    @commands.guild_only()
+    @commands.admin_or_permissions(administrator=True)
+    @commands.command(name="serverwrapped-concurrency")
+    async def set_concurrency(self, ctx: commands.Context, concurrency: int):
+        """Set how many channels are scanned at once."""
+        if not 1 <= concurrency <= MAX_SCAN_CONCURRENCY:
+            await ctx.send(f"Concurrency must be between 1 and {MAX_SCAN_CONCURRENCY}.")
+            return
+        await self.config.guild(ctx.guild).scan_concurrency.set(concurrency)
+        await ctx.send(f"Up to {concurrency} channels will be scanned at once.")
+
+    @commands.guild_only()
+    @commands.admin_or_permissions(administrator=True)
+    @commands.command(name="serverwrapped-tokenizer")
+    async def set_tokenizer(self, ctx: commands.Context, mode: str):
+        """Choose how messages are split into words: `nltk` (Punkt) or `fast` (plain string ops)."""
+        mode = mode.lower()
+        if mode not in TOKENIZERS:
+            await ctx.send(f"Unknown tokenizer. Pick one of: {', '.join(TOKENIZERS)}")
+            return
+        await self.config.guild(ctx.guild).tokenizer.set(mode)
+        # cached results were computed with the old tokenizer
+        await self.index.clear_stats(ctx.guild.id)
+        await ctx.send(f"Wrapped will use the `{mode}` tokenizer.")
+
     # -------------------
     # Main command
     # -------------------
@@ -88,43 +107,164 @@ class ServerWrapped(commands.Cog):
             await ctx.send("No channels configured. Admin must run `[p]serverwrapped-setup` first.")
             return
 
-        start = datetime(year, 1, 1, tzinfo=timezone.utc)
+        year_start = datetime(year, 1, 1, tzinfo=timezone.utc)
         end = datetime(year + 1, 1, 1, tzinfo=timezone.utc)
-        if target.joined_at and target.joined_at.replace(tzinfo=timezone.utc) > start:
-            start = target.joined_at.replace(tzinfo=timezone.utc)
+        start = self._member_start(target, year_start)
+        channel_key = _channel_key(allowed_channel_ids)
+        closed_year = end <= datetime.now(timezone.utc)
+
+        # A finished year can't change, so a result computed after it ended needs no sync or
+        # recount at all; one computed while the year was still running may be missing its end
+        if closed_year:
+            stats = await self.index.get_stats(ctx.guild.id, target.id, year, channel_key, computed_since=end.timestamp())
+            if stats is not None:
+                await ctx.send(embed=self._build_embed(ctx.guild, target, str(year), stats))
+                return
 
         await ctx.typing()
-        messages = []
-        for cid in allowed_channel_ids:
-            ch = ctx.guild.get_channel(cid)
-            if not ch or not isinstance(ch, discord.TextChannel):
-                continue
-            try:
-                async for m in ch.history(limit=None, after=start, before=end, oldest_first=True):
-                    if m.author and m.author.id == target.id and not m.author.bot:
-                        messages.append(m)
-            except discord.Forbidden:
-                continue
-            except discord.HTTPException:
-                await asyncio.sleep(1)
-                continue
-            await asyncio.sleep(0)
+        # Index the whole year (not just since the target joined) so other members' calls reuse it
+        channel_ids, _, failed = await self._sync_channels(ctx.guild, allowed_channel_ids, year_start, end)
 
-        if not messages:
+        message_count = await self.index.count(ctx.guild.id, target.id, channel_ids, start, end)
+        if not message_count:
             await ctx.send(f"{target} had no messages in configured channels for {year}.")
             return
 
-        stats = self._analyze_messages(messages)
+        stats = await self.index.get_stats(
+            ctx.guild.id, target.id, year, channel_key, message_count, STATS_MAX_DELTA, STATS_TTL
+        )
+        if stats is None:
+            tokenizer = await self.config.guild(ctx.guild).tokenizer()
+            if not await self._nltk_ready(ctx, tokenizer):
+                return
+            # results from a partial scan would otherwise be frozen for closed years and months
+            stats = await self._compute_stats(
+                ctx, ctx.guild.id, target.id, channel_ids, channel_key, start, end, tokenizer, store=not failed
+            )
+            if not failed:
+                await self.index.put_stats(ctx.guild.id, target.id, year, channel_key, stats, STATS_MAX_ENTRIES)
+
+        embed = self._build_embed(ctx.guild, target, str(year), stats)
+        if failed:
+            embed.set_footer(text="Some channels couldn't be fully scanned yet; run the command again to resume.")
+
+        await ctx.send(embed=embed)
+
+    @commands.guild_only()
+    @commands.command(name="wrapped-recent")
+    async def wrapped_recent(self, ctx: commands.Context, member: Optional[discord.Member] = None, days: int = RECENT_DAYS):
+        """Wrapped for the last `days` days, built from the same monthly aggregates as the yearly one."""
+        target = member or ctx.author
+        days = max(1, min(days, MAX_RECENT_DAYS))
+
+        allowed_channel_ids = await self.config.guild(ctx.guild).channels()
+        if not allowed_channel_ids:
+            await ctx.send("No channels configured. Admin must run `[p]serverwrapped-setup` first.")
+            return
+
+        end = datetime.now(timezone.utc)
+        range_start = end - timedelta(days=days)
+        start = self._member_start(target, range_start)
+        await ctx.typing()
+        channel_ids, _, failed = await self._sync_channels(ctx.guild, allowed_channel_ids, range_start)
+
+        if not await self.index.count(ctx.guild.id, target.id, channel_ids, start, end):
+            await ctx.send(f"{target} had no messages in configured channels in the last {days} days.")
+            return
+        tokenizer = await self.config.guild(ctx.guild).tokenizer()
+        if not await self._nltk_ready(ctx, tokenizer):
+            return
+        stats = await self._compute_stats(
+            ctx, ctx.guild.id, target.id, channel_ids, _channel_key(allowed_channel_ids), start, end, tokenizer,
+            store=not failed,
+        )
+
+        embed = self._build_embed(ctx.guild, target, f"the last {days} days", stats)
+        if failed:
+            embed.set_footer(text="Some channels couldn't be fully scanned yet; run the command again to resume.")
+        await ctx.send(embed=embed)
+
+    @commands.guild_only()
+    @commands.admin_or_permissions(administrator=True)
+    @commands.command(name="wrapped-all")
+    async def wrapped_all(self, ctx: commands.Context, year: Optional[int] = None):
+        """Compute wrapped for every member at once so individual `[p]wrapped` calls are instant."""
+        year = year or datetime.now(timezone.utc).year
+        allowed_channel_ids = await self.config.guild(ctx.guild).channels()
+        if not allowed_channel_ids:
+            await ctx.send("No channels configured. Admin must run `[p]serverwrapped-setup` first.")
+            return
 
-        embed = discord.Embed(title=f"{ctx.guild.name} Wrapped — {year}", color=discord.Color.brand_red())
+        await ctx.typing()
+        year_start = datetime(year, 1, 1, tzinfo=timezone.utc)
+        end = datetime(year + 1, 1, 1, tzinfo=timezone.utc)
+        # One history pass per channel for everyone; the index then shards it by author
+        channel_ids, _, failed = await self._sync_channels(ctx.guild, allowed_channel_ids, year_start, end)
+        channel_key = _channel_key(allowed_channel_ids)
+        tokenizer = await self.config.guild(ctx.guild).tokenizer()
+        if not await self._nltk_ready(ctx, tokenizer):
+            return
+
+        async def compute(member):
+            start = self._member_start(member, year_start)
+            stats = await self._compute_stats(
+                None, ctx.guild.id, member.id, channel_ids, channel_key, start, end, tokenizer, store=not failed
+            )
+            if not stats["message_count"]:
+                return False
+            if not failed:
+                await self.index.put_stats(ctx.guild.id, member.id, year, channel_key, stats, STATS_MAX_ENTRIES)
+            return True
+
+        members = []
+        for author_id in await self.index.authors(ctx.guild.id, channel_ids, year_start, end):
+            member = ctx.guild.get_member(author_id)
+            if member is not None and not member.bot:
+                members.append(member)
+        # the analysis semaphore keeps this from taking more than the pool's workers
+        computed = sum(await asyncio.gather(*(compute(m) for m in members)))
+
+        msg = f"Computed {year} wrapped for {computed} members."
+        if failed:
+            msg += f" Couldn't fully scan, so nothing was cached: {', '.join(f'<#{cid}>' for cid in failed)}"
+        await ctx.send(msg)
+
+    @commands.is_owner()
+    @commands.command(name="serverwrapped-nltk")
+    async def fetch_nltk(self, ctx: commands.Context):
+        """Download any NLTK data wrapped needs that isn't installed yet."""
+        missing = await asyncio.to_thread(missing_nltk_resources)
+        if not missing:
+            await ctx.send("All NLTK data wrapped needs is already installed.")
+            return
+        async with ctx.typing():
+            failed = await asyncio.to_thread(download_nltk_resources, missing)
+        self._nltk_checked.clear()
+        if failed:
+            await ctx.send(f"Couldn't download: {', '.join(failed)}")
+        else:
+            await ctx.send(f"Downloaded: {', '.join(missing)}")
+
+    async def _nltk_ready(self, ctx: commands.Context, tokenizer: str) -> bool:
+        """Check (once per tokenizer mode) that the NLTK data is available locally."""
+        if tokenizer in self._nltk_checked:
+            return True
+        missing = await asyncio.to_thread(missing_nltk_resources, tokenizer)
+        if missing:
+            await ctx.send(f"Wrapped is missing NLTK data ({', '.join(missing)}). The bot owner can run `[p]serverwrapped-nltk`.")
+            return False
+        self._nltk_checked.add(tokenizer)
+        return True
+
+    def _build_embed(self, guild: discord.Guild, target: discord.Member, period: str, stats: dict) -> discord.Embed:
+        embed = discord.Embed(title=f"{guild.name} Wrapped — {period}", color=discord.Color.brand_red())
         embed.set_author(name=str(target), icon_url=target.avatar.url if target.avatar else None)
 
-        # How year started
-        first_msg = min(messages, key=lambda m: m.created_at)
+        # How the period started
         first_topic = stats["topics"][0] if stats["topics"] else "chatting"
         embed.add_field(
-            name="How the year started",
-            value=f"You started off the year strong with a discussion about **{first_topic}**:\n{self._shorten(first_msg.content)}",
+            name=f"How {period} started",
+            value=f"You started off {period} strong with a discussion about **{first_topic}**:\n{self._shorten(stats['first_message'])}",
             inline=False
         )
 
@@ -133,7 +273,7 @@ class ServerWrapped(commands.Cog):
         embed.add_field(name="Most common topics", value=topics_pretty, inline=False)
 
         # Sidekicks
-        sidekicks_pretty = "\n".join(f"{i+1}. {name} — {count} msgs" for i, (name, count) in enumerate(stats["sidekicks"][:8])) if stats["sidekicks"] else "—"
+        sidekicks_pretty = "\n".join(f"{i+1}. {self._display_name(guild, uid)} — {count} msgs" for i, (uid, count) in enumerate(stats["sidekicks"][:8])) if stats["sidekicks"] else "—"
         embed.add_field(name="Most common sidekicks", value=sidekicks_pretty, inline=False)
 
         # Emojis
@@ -142,178 +282,276 @@ class ServerWrapped(commands.Cog):
 
         # Summary
         st_lines = [
-            f"Total messages: **{len(messages)}**",
+            f"Total messages: **{stats['message_count']}**",
             f"Attachments posted: **{stats['attachments']}**",
             f"Messages with reactions: **{stats['reacted_messages']}**",
         ]
         embed.add_field(name="Summary", value="\n".join(st_lines), inline=False)
 
         # Highlight
-        if stats["highlight"]:
-            highlight_msg, _ = stats["highlight"]
-            hl_text = f"{self._shorten(highlight_msg.content)}\n— in <#{highlight_msg.channel.id}> on {highlight_msg.created_at.date()}"
+        highlight = stats["highlight"]
+        if highlight:
+            hl_text = f"{self._shorten(highlight['content'])}\n— in <#{highlight['channel_id']}> on {_utc(highlight['created_at']).date()}"
             embed.add_field(name="Highlight", value=hl_text, inline=False)
         else:
             embed.add_field(name="Highlight", value="Couldn't find a suitable highlight.", inline=False)
 
-        await ctx.send(embed=embed)
+        # Runners-up
+        runners_up = stats.get("highlights", [])[1:]
+        if runners_up:
+            top_pretty = "\n".join(
+                f"{i+2}. {self._shorten(h['content'], 80)} — <#{h['channel_id']}>" for i, h in enumerate(runners_up)
+            )
+            embed.add_field(name="More highlights", value=top_pretty, inline=False)
+
+        return embed
+
+    def _member_start(self, member: discord.Member, year_start: datetime) -> datetime:
+        if member.joined_at and member.joined_at.replace(tzinfo=timezone.utc) > year_start:
+            return member.joined_at.replace(tzinfo=timezone.utc)
+        return year_start
+
+    @commands.guild_only()
+    @commands.admin_or_permissions(administrator=True)
+    @commands.command(name="serverwrapped-backfill")
+    async def backfill(self, ctx: commands.Context, year: Optional[int] = None):
+        """Index configured channels from the start of `year` so later wrapped calls only fetch new messages."""
+        year = year or datetime.now(timezone.utc).year
+        allowed_channel_ids = await self.config.guild(ctx.guild).channels()
+        if not allowed_channel_ids:
+            await ctx.send("No channels configured. Admin must run `[p]serverwrapped-setup` first.")
+            return
+
+        await ctx.typing()
+        start = datetime(year, 1, 1, tzinfo=timezone.utc)
+        _, added, failed = await self._sync_channels(ctx.guild, allowed_channel_ids, start)
+        msg = f"Indexed {added} new messages since {start.date()}."
+        if failed:
+            msg += f" Couldn't read: {', '.join(f'<#{cid}>' for cid in failed)}"
+        await ctx.send(msg)
 
     # -------------------
-    # Analysis
+    # Index
     # -------------------
-    def _analyze_messages(self, messages: List[discord.Message]) -> dict:
-        channels_counter = Counter()
-        sidekick_counter = Counter()
-        emoji_counter = Counter()
-        all_words = []
-        candidate_highlights = []
-        total_attachments = 0
-        reacted_messages = 0
-
-        for m in messages:
-            channels_counter[m.channel.name] += 1
-            if m.attachments:
-                total_attachments += len(m.attachments)
-            if m.reactions:
-                reacted_messages += 1
-
-            # sidekicks
-            if m.reference and m.reference.resolved and isinstance(m.reference.resolved, discord.Message):
-                ref = m.reference.resolved
-                sidekick_counter[ref.author.display_name] += 1
-            for u in m.mentions:
-                if u.id != m.author.id:
-                    sidekick_counter[u.display_name] += 1
-
-            # emojis
-            for match in CUSTOM_EMOJI_RE.findall(m.content):
-                emoji_counter[match] += 1
-            for match in UNICODE_EMOJI_RE.findall(m.content):
-                emoji_counter[match] += 1
-            for token in m.content.split():
-                if COLON_EMOJI_RE.match(token):
-                    emoji_counter[token] += 1
-
-            # words for topics
-            text_no_url = URL_RE.sub("", m.content or "")
-            tokens = [w.lower() for w in word_tokenize(text_no_url) if w.isalpha()]
-            tokens = [t for t in tokens if t not in STOPWORDS]
-            all_words.append(tokens)
-
-            candidate_highlights.append(m)
-
-        # topics: noun/adjective bigrams and trigrams
-        topics = self._extract_topics(all_words)
-
-        # highlight
-        highlight_msg, highlight_attach = self._choose_highlight(candidate_highlights, all_words)
-
-        return {
-            "topics": topics,
-            "sidekicks": sidekick_counter.most_common(),
-            "emojis": emoji_counter.most_common(),
-            "attachments": total_attachments,
-            "reacted_messages": reacted_messages,
-            "highlight": (highlight_msg, highlight_attach)
-        }
-
-    def _extract_topics(self, list_of_wordlists: List[List[str]]) -> List[str]:
-        counts = Counter()
-        for words in list_of_wordlists:
-            # POS tagging for nouns/adjectives
-            pos = pos_tag(words)
-            nouns_adj = [w for w, p in pos if p.startswith("NN") or p.startswith("JJ")]
-            # bigrams and trigrams
-            for n in [2, 3]:
-                for gram in ngrams(nouns_adj, n):
-                    counts[" ".join(gram)] += 1
-        # filter low counts
-        return [t for t, c in counts.most_common(20) if c >= 2]
-
-    def _choose_highlight(self, candidates: List[discord.Message], all_words: List[List[str]]) -> Tuple[Optional[discord.Message], Optional[str]]:
-        best_score = -9999
-        best_msg = None
-        best_attach_url = None
-
-        word_counts = Counter([w for sublist in all_words for w in sublist])
-        common_words_set = {w for w, _ in word_counts.most_common(200)}
-
-        for m in candidates:
-            if not self._is_message_valid_for_highlight(m):
+    async def _sync_channels(self, guild: discord.Guild, channel_ids: List[int], start: datetime,
+                             end: Optional[datetime] = None) -> Tuple[List[int], int, List[int]]:
+        """Sync several channels in parallel, at most `scan_concurrency` at a time.
+
+        Each channel's history is its own rate-limit bucket in discord.py, which already waits
+        out 429s per bucket, so the semaphore only has to keep us from hammering the global limit.
+        Returns (channels usable for queries, messages added, channels that failed).
+        """
+        limit = await self.config.guild(guild).scan_concurrency()
+        semaphore = asyncio.Semaphore(max(1, limit))
+        channels = [ch for ch in map(guild.get_channel, channel_ids) if isinstance(ch, discord.TextChannel)]
+
+        async def run(ch):
+            async with semaphore:
+                return await self._sync_channel(ch, start, end)
+
+        results = await asyncio.gather(*(run(ch) for ch in channels), return_exceptions=True)
+        synced, failed, added = [], [], 0
+        for ch, result in zip(channels, results):
+            if isinstance(result, discord.Forbidden):
+                failed.append(ch.id)
+                continue
+            if isinstance(result, discord.HTTPException):
+                # the checkpointed part is still worth answering from; the next call resumes the rest
+                failed.append(ch.id)
+                synced.append(ch.id)
                 continue
+            if isinstance(result, BaseException):
+                raise result
+            added += result
+            synced.append(ch.id)
+        return synced, added, failed
+
+    async def _sync_channel(self, channel: discord.TextChannel, start: datetime, end: Optional[datetime] = None) -> int:
+        """Make the index cover `channel` from `start` onwards (or up to `end`). Returns messages added.
+
+        Progress is checkpointed in the index, so an interrupted sync picks up where it stopped.
+        """
+        async with self._channel_locks[channel.id]:
+            state = await self.index.channel_state(channel.id)
+            if state is None:
+                await self.index.set_channel_state(channel.guild.id, channel.id, start.timestamp())
+                state = await self.index.channel_state(channel.id)
+            added = 0
+
+            # Older history than we have: finish any interrupted fill first, then extend further back if needed
+            while state.fill_from is not None or start.timestamp() < state.oldest:
+                if state.fill_from is None:
+                    await self.index.start_fill(channel.id, start.timestamp())
+                    state = state._replace(fill_from=start.timestamp())
+                after = discord.Object(id=state.fill_cursor) if state.fill_cursor else _utc(state.fill_from)
+                added += await self._scan(
+                    channel, after, before=_utc(state.oldest),
+                    checkpoint=functools.partial(self.index.fill_checkpoint, channel.id),
+                )
+                await self.index.finish_fill(channel.id)
+                state = await self.index.channel_state(channel.id)
+
+            # Closed ranges the index already covers need no API calls at all
+            if end and state.last_message_id and discord.utils.snowflake_time(state.last_message_id) >= end:
+                return added
+
+            # Live before the final scan, so nothing posted between its last page and the end
+            # of the sync is missed; the listener doesn't advance the checkpoint meanwhile
+            self._live_channels.add(channel.id)
+            scan_started = discord.utils.time_snowflake(datetime.now(timezone.utc))
+            after = discord.Object(id=state.last_message_id) if state.last_message_id else _utc(state.oldest)
+            try:
+                added += await self._scan(channel, after, checkpoint=functools.partial(self.index.advance, channel.id))
+            except BaseException:
+                self._live_channels.discard(channel.id)
+                raise
+            await self.index.advance(channel.id, scan_started)
+            return added
+
+    async def _scan(self, channel: discord.TextChannel, after, before=None, checkpoint=None) -> int:
+        """Copy a slice of channel history into the index. Returns messages indexed.
+
+        Every INDEX_BATCH_SIZE messages the batch is written and `checkpoint` is awaited with the
+        last message id reached. HTTP errors retry from that message with exponential backoff,
+        so no page is fetched twice.
+        """
+        batch = []
+        count = 0
+        seen = 0
+        last_id = None
+
+        async def flush():
+            nonlocal batch, count
+            await self.index.add(batch)
+            count += len(batch)
+            batch = []
+            if checkpoint and last_id:
+                await checkpoint(last_id)
+
+        for attempt in range(SCAN_RETRIES + 1):
+            try:
+                async for m in channel.history(limit=None, after=after, before=before, oldest_first=True):
+                    last_id = m.id
+                    seen += 1
+                    if not m.author.bot:
+                        batch.append(IndexedMessage.from_message(m))
+                    if seen % INDEX_BATCH_SIZE == 0:
+                        await flush()
+                await flush()
+                return count
+            except discord.Forbidden:
+                await flush()
+                raise
+            except discord.HTTPException:
+                await flush()
+                if attempt == SCAN_RETRIES:
+                    raise
+                if last_id:
+                    after = discord.Object(id=last_id)
+                await asyncio.sleep(SCAN_BACKOFF * 2 ** attempt)
+        return count
+
+    @commands.Cog.listener()
+    async def on_message(self, message: discord.Message):
+        if not message.guild or message.channel.id not in self._live_channels:
+            return
+        if not message.author.bot:
+            await self.index.add([IndexedMessage.from_message(message)])
+        # a sync in progress may not have reached older messages yet; INSERT OR REPLACE makes
+        # indexing this one again harmless, so only the checkpoint has to wait for it
+        if not self._channel_locks[message.channel.id].locked():
+            await self.index.advance(message.channel.id, message.id)
+
+    @commands.Cog.listener()
+    async def on_ready(self):
+        # A fresh gateway session may have missed events, so every channel needs a delta fetch again
+        self._live_channels.clear()
+
+    @commands.Cog.listener()
+    async def on_raw_reaction_add(self, payload: discord.RawReactionActionEvent):
+        if payload.channel_id in self._live_channels:
+            await self.index.add_reactions(payload.message_id, 1)
+
+    @commands.Cog.listener()
+    async def on_raw_reaction_remove(self, payload: discord.RawReactionActionEvent):
+        if payload.channel_id in self._live_channels:
+            await self.index.add_reactions(payload.message_id, -1)
+
+    @commands.Cog.listener()
+    async def on_raw_message_edit(self, payload: discord.RawMessageUpdateEvent):
+        if payload.channel_id in self._live_channels and "content" in payload.data:
+            await self.index.edit(payload.message_id, payload.data["content"])
+
+    @commands.Cog.listener()
+    async def on_raw_message_delete(self, payload: discord.RawMessageDeleteEvent):
+        if payload.channel_id in self._live_channels:
+            await self.index.delete(payload.message_id)
 
-            score = 0
-            content = (m.content or "").strip()
-
-            # length
-            if MIN_HIGHLIGHT_LEN <= len(content) <= MAX_HIGHLIGHT_LEN:
-                score += SCORE_WEIGHTS["length"]
-
-            # attachments
-            image_url = None
-            for a in m.attachments:
-                if a.content_type and a.content_type.startswith("image"):
-                    image_url = a.url
-                    break
-                if a.filename.lower().endswith((".gif", ".png", ".jpg", ".jpeg", ".webp")):
-                    image_url = a.url
-                    break
-            if image_url:
-                score += SCORE_WEIGHTS["attachment"]
-
-            # emojis
-            emoji_count = len(UNICODE_EMOJI_RE.findall(content)) + len(CUSTOM_EMOJI_RE.findall(content))
-            if 1 <= emoji_count <= 3:
-                score += SCORE_WEIGHTS["emoji"]
-
-            # question
-            if "?" in content:
-                score += SCORE_WEIGHTS["question"]
-
-            # reactions
-            reaction_count = sum(r.count for r in m.reactions)
-            score += min(reaction_count * SCORE_WEIGHTS["reactions"], REACTION_SCORE_CAP)
-
-            # url / mentions penalty
-            if URL_RE.search(content):
-                score += SCORE_WEIGHTS["url"]
-            if m.mentions:
-                score += SCORE_WEIGHTS["mentions"]
-
-            # rare word
-            words = [w.lower() for w in word_tokenize(URL_RE.sub("", content)) if w.isalpha()]
-            if any(w not in common_words_set and w not in STOPWORDS and len(w) > 2 for w in words):
-                score += SCORE_WEIGHTS["rare_word"]
-
-            # freshness tie-breaker
-            freshness = (m.created_at - datetime(1970, 1, 1, tzinfo=timezone.utc)).total_seconds() / 1e9
-            score += freshness * 1e-6
-
-            if score > best_score:
-                best_score = score
-                best_msg = m
-                best_attach_url = image_url
-
-        return best_msg, best_attach_url
-
-    def _is_message_valid_for_highlight(self, m: discord.Message) -> bool:
-        if not m.content and not m.attachments:
-            return False
-        if m.author.bot:
-            return False
-        content = (m.content or "").strip()
-        if content and (len(content) < MIN_HIGHLIGHT_LEN or len(content) > MAX_HIGHLIGHT_LEN):
-            if not m.attachments:
-                return False
-        if content and URL_RE.sub("", content).strip() == "":
-            return False
-        if MENTION_RE.match(content):
-            return False
-        if ONLY_ANY_EMOJI_RE.match(content):
-            return False
-        if content.startswith(("!", ".", "-", "~", "/")):
-            return False
-        return True
+    # -------------------
+    # Analysis
+    # -------------------
+    async def _compute_stats(self, ctx: Optional[commands.Context], guild_id: int, author_id: int,
+                             channel_ids: List[int], channel_key: str, start: datetime, end: datetime,
+                             tokenizer: str, store: bool = True) -> dict:
+        """One member's stats for [start, end), merged from monthly partial aggregates.
+
+        Months fully inside the range that have already ended are read from the index, or
+        computed and stored there when `store` is set; the rest are recomputed every time.
+        """
+        now = datetime.now(timezone.utc)
+        months = _months(start, end)
+        closed = [key for key, m_start, m_end, full in months if full and m_end <= now]
+        partials = await self.index.get_partials(guild_id, author_id, channel_key, closed)
+
+        todo = [(key, m_start, m_end) for key, m_start, m_end, _ in months if key not in partials]
+        if todo:
+            computed = await self._analyze_partials(
+                ctx, guild_id, author_id, channel_ids, [(m_start, m_end) for _, m_start, m_end in todo], tokenizer
+            )
+            computed = {key: data for (key, _, _), data in zip(todo, computed)}
+            if store:
+                await self.index.put_partials(
+                    guild_id, author_id, channel_key,
+                    {key: data for key, data in computed.items() if key in closed},
+                    PARTIALS_MAX_ENTRIES,
+                )
+            partials.update(computed)
+
+        total = PartialAggregate()
+        for key, *_ in months:
+            total.merge(PartialAggregate.from_dict(partials[key]))
+        return total.finish()
+
+    async def _analyze_partials(self, ctx: Optional[commands.Context], guild_id: int, author_id: int,
+                                channel_ids: List[int], ranges: List[Tuple[datetime, datetime]], tokenizer: str) -> List[dict]:
+        """Build one member's partial aggregates for `ranges` in the process pool.
+
+        At most ANALYSIS_WORKERS analyses run at once; when they're all busy and `ctx` is given,
+        the caller is told where they are in the queue. Workers read the compact records straight
+        from the index, so only the query and the partials cross the process boundary.
+        """
+        if self._analysis_slots.locked():
+            self._analysis_queue += 1
+            if ctx is not None:
+                await ctx.send(f"Wrapped is busy right now — you're number {self._analysis_queue} in the queue.")
+            try:
+                await self._analysis_slots.acquire()
+            finally:
+                self._analysis_queue -= 1
+        else:
+            await self._analysis_slots.acquire()
+        try:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(max_workers=ANALYSIS_WORKERS)
+            return await asyncio.get_running_loop().run_in_executor(
+                self._pool, analyze_partials, self.index.path, guild_id, author_id, channel_ids, ranges, tokenizer
+            )
+        finally:
+            self._analysis_slots.release()
+
+    def _display_name(self, guild: discord.Guild, user_id: int) -> str:
+        member = guild.get_member(user_id)
+        return member.display_name if member else f"<@{user_id}>"
 
     def _shorten(self, text: str, limit: int = 240) -> str:
         if not text:
@@ -323,6 +561,30 @@ class ServerWrapped(commands.Cog):
             return t
         return t[:limit-1].rsplit(" ", 1)[0] + "…"
 
+def _utc(ts: float) -> datetime:
+    return datetime.fromtimestamp(ts, tz=timezone.utc)
+
+def _channel_key(channel_ids: List[int]) -> str:
+    return ",".join(str(cid) for cid in sorted(channel_ids))
+
+def _months(start: datetime, end: datetime) -> List[Tuple[int, datetime, datetime, bool]]:
+    """Calendar months overlapping [start, end) as (year * 100 + month, range start, range end,
+    whether the whole month is inside the range)."""
+    months = []
+    month_start = datetime(start.year, start.month, 1, tzinfo=timezone.utc)
+    while month_start < end:
+        if month_start.month == 12:
+            month_end = datetime(month_start.year + 1, 1, 1, tzinfo=timezone.utc)
+        else:
+            month_end = datetime(month_start.year, month_start.month + 1, 1, tzinfo=timezone.utc)
+        months.append((
+            month_start.year * 100 + month_start.month,
+            max(month_start, start), min(month_end, end),
+            month_start >= start and month_end <= end,
+        ))
+        month_start = month_end
+    return months
+
 # Cog setup
 def setup(bot):
     bot.add_cog(ServerWrapped(bot))